@@ -0,0 +1,290 @@
+import io
+import json
+import math
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+import archive
+import nfe
+from importer import ImportBatch, ignore_interrupt
+from model import MISSING, PARTY_FIELDS, TAX_COLUMNS, format_cents, format_quantity
+
+HOST = '127.0.0.1'
+PORT = 8080
+
+# Maior XML aceito por requisição
+MAX_BODY = 20 * 1024 * 1024
+
+# Requisições aguardando o pool, por processo; acima disso a resposta é 503 (com Retry-After)
+# em vez de uma fila que cresce sem limite
+PENDING_PER_WORKER = 8
+
+# Latências guardadas por rota para os percentis de /metrics
+LATENCY_SAMPLES = 10000
+
+
+def note_to_dict(data):
+    # Valores monetários e quantidades como texto decimal, sem arredondamento de float
+    produtos = data.produtos
+    items = []
+    for index, descricao in enumerate(produtos.descricao):
+        item = {
+            'descricao': descricao,
+            'ncm': produtos.ncm[index],
+            'cfop': produtos.cfop[index],
+            'quantidade': format_quantity(produtos.quantity_at(index)),
+            'valor': format_cents(produtos.value_at(index)),
+        }
+        for name in TAX_COLUMNS:
+            value = getattr(produtos, name)[index]
+            item[name] = None if value == MISSING else format_cents(value)
+        items.append(item)
+    return {
+        'chave': data.chave,
+        'numero': data.numero,
+        'serie': data.serie,
+        'emissao': data.emissao,
+        'valor_total': format_cents(data.valor_total),
+        'emitente': {field: getattr(data.emitente, field) for field in PARTY_FIELDS},
+        'destinatario': {field: getattr(data.destinatario, field) for field in PARTY_FIELDS},
+        'produtos': items,
+    }
+
+
+# Executados nos processos do pool: só bytes entram e saem, a resposta já vem serializada
+
+def parse_document(raw):
+    return json.dumps(note_to_dict(nfe.parse_nfe(raw)), ensure_ascii=False).encode('utf-8')
+
+
+def render_document(raw):
+    import danfe
+    output = io.BytesIO()
+    danfe.generate_danfe(nfe.parse_nfe(raw), output)
+    return output.getvalue()
+
+
+def prepare_document(raw):
+    # Nota e hashes/compressão para o arquivo de XMLs; a gravação fica no processo do servidor
+    return nfe.parse_nfe(raw), archive.Prepared(raw)
+
+
+def percentile(values, fraction):
+    # Percentil pelo método do posto mais próximo
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class RequestMetrics:
+    # Contadores e latências recentes por rota, lidos por GET /metrics
+    def __init__(self, samples=LATENCY_SAMPLES):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = Counter()
+        self.errors = Counter()
+        self.latencies = {}
+        self.samples = samples
+        self.rejected = 0
+        self.in_flight = 0
+
+    def begin(self):
+        with self.lock:
+            self.in_flight += 1
+
+    def end(self, route, status, seconds):
+        with self.lock:
+            self.in_flight -= 1
+            self.requests[route] += 1
+            if status >= 400:
+                self.errors[route] += 1
+            if status == 503:
+                # Recusadas não entram nos percentis: a resposta imediata mascararia a espera real
+                self.rejected += 1
+                return
+            latencies = self.latencies.get(route)
+            if latencies is None:
+                latencies = self.latencies[route] = deque(maxlen=self.samples)
+            latencies.append(seconds)
+
+    def snapshot(self):
+        with self.lock:
+            routes = {}
+            for route, latencies in self.latencies.items():
+                values = list(latencies)
+                routes[route] = {
+                    'requisicoes': self.requests[route],
+                    'erros': self.errors[route],
+                    'media_ms': sum(values) / len(values) * 1000,
+                    'p50_ms': percentile(values, 0.50) * 1000,
+                    'p95_ms': percentile(values, 0.95) * 1000,
+                    'p99_ms': percentile(values, 0.99) * 1000,
+                    'max_ms': max(values) * 1000,
+                }
+            return {
+                'ativo_desde': self.started,
+                'em_andamento': self.in_flight,
+                'recusadas': self.rejected,
+                'rotas': routes,
+            }
+
+
+class APIError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class NFeRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Cabeçalho e corpo saem num único envio (evita o atraso do ACK retardado)
+    wbufsize = -1
+
+    def do_GET(self):
+        self._dispatch(self.server.get_routes)
+
+    def do_POST(self):
+        self._dispatch(self.server.post_routes)
+
+    def _dispatch(self, routes):
+        start = time.perf_counter()
+        route = urlsplit(self.path).path
+        handler = routes.get(route)
+        self.body_read = False
+        self.server.metrics.begin()
+        try:
+            if handler is None:
+                raise APIError(404, f"Rota desconhecida: {route}")
+            status, body, content_type = handler(self)
+        except APIError as e:
+            status, body, content_type = e.status, self._error_body(e), 'application/json'
+        except ET.ParseError as e:
+            status, body, content_type = 400, self._error_body(f"XML inválido: {e}"), 'application/json'
+        except Exception as e:
+            status, body, content_type = 500, self._error_body(f"{type(e).__name__}: {e}"), 'application/json'
+        if self.command == 'POST' and not self.body_read:
+            # Um corpo não lido ficaria na conexão e seria lido como a próxima requisição
+            self.close_connection = True
+        elapsed = time.perf_counter() - start
+        try:
+            self._send(status, body, content_type, elapsed)
+        finally:
+            self.server.metrics.end(route if handler is not None else '(desconhecida)', status, elapsed)
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding'):
+            raise APIError(411, "Envie o XML com Content-Length (sem chunked)")
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            raise APIError(411, "Content-Length obrigatório") from None
+        if length > MAX_BODY:
+            raise APIError(413, f"XML maior que {MAX_BODY // (1024 * 1024)} MB")
+        if length <= 0:
+            raise APIError(400, "Corpo vazio: envie o XML da NF-e")
+        body = self.rfile.read(length)
+        self.body_read = True
+        return body
+
+    def _error_body(self, error):
+        return json.dumps({'erro': str(error)}, ensure_ascii=False).encode('utf-8')
+
+    def _send(self, status, body, content_type, elapsed):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        # Tempo gasto no servidor, visível para o cliente sem consultar /metrics
+        self.send_header('Server-Timing', f'total;dur={elapsed * 1000:.2f}')
+        if status == 503:
+            self.send_header('Retry-After', '1')
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class NFeServer(ThreadingHTTPServer):
+    # Uma thread por conexão para ler e responder; parse e DANFE (CPU) rodam no pool de processos
+    daemon_threads = True
+    # Fila de conexões do listen(): o padrão (5) recusa rajadas de clientes conectando juntos
+    request_queue_size = 128
+
+    def __init__(self, address, workers=None, store=None, xml_archive=None):
+        super().__init__(address, NFeRequestHandler)
+        workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=ignore_interrupt)
+        self.slots = threading.BoundedSemaphore(workers * PENDING_PER_WORKER)
+        self.metrics = RequestMetrics()
+        # Gravações no banco e no arquivo de XMLs são serializadas (uma conexão de cada)
+        self.store = store
+        self.xml_archive = xml_archive
+        self.store_lock = threading.Lock()
+        self.get_routes = {'/health': self.health, '/metrics': self.metrics_route}
+        self.post_routes = {'/nfe/parse': self.parse, '/nfe/danfe': self.danfe, '/nfe/import': self.import_note}
+
+    def run(self, func, raw):
+        if not self.slots.acquire(blocking=False):
+            raise APIError(503, "Servidor ocupado, tente novamente")
+        try:
+            return self.pool.submit(func, raw).result()
+        finally:
+            self.slots.release()
+
+    def health(self, request):
+        return 200, b'{"status": "ok"}', 'application/json'
+
+    def metrics_route(self, request):
+        return 200, json.dumps(self.metrics.snapshot(), indent=2).encode('utf-8'), 'application/json'
+
+    def parse(self, request):
+        return 200, self.run(parse_document, request.read_body()), 'application/json'
+
+    def danfe(self, request):
+        return 200, self.run(render_document, request.read_body()), 'application/pdf'
+
+    def import_note(self, request):
+        if self.store is None:
+            raise APIError(404, "Importação desativada neste servidor")
+        raw = request.read_body()
+        # Bytes idênticos a um XML já arquivado dispensam o parse (se a nota estiver no banco)
+        if self.xml_archive is not None:
+            known = self.xml_archive.archived(archive.raw_digest(raw))
+            if known is not None:
+                return self._import(None, known)
+        data, prepared = self.run(prepare_document, raw)
+        if not data.chave:
+            raise APIError(422, "Documento sem chave de acesso (não é uma NF-e?)")
+        return self._import(data, prepared if self.xml_archive is not None else None)
+
+    def _import(self, data, prepared):
+        # Nota gravada e XML arquivado juntos (importer.ImportBatch); 201 se a nota era nova no banco
+        with self.store_lock:
+            batch = ImportBatch(self.store, self.xml_archive)
+            imported = batch.add(data, prepared)
+            batch.flush()
+        if imported is None:
+            return 200, self._import_body(prepared.chave if data is None else data.chave, True), 'application/json'
+        return 201, self._import_body(imported.chave, False), 'application/json'
+
+    def _import_body(self, chave, duplicate):
+        return json.dumps({'chave': chave, 'duplicado': duplicate}).encode('utf-8')
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(cancel_futures=True)
+
+
+def start_server(host=HOST, port=PORT, workers=None, store=None, xml_archive=None):
+    # Sobe o servidor numa thread; port=0 escolhe uma porta livre (server.server_port)
+    server = NFeServer((host, port), workers, store, xml_archive)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,290 @@
+import hashlib
+import threading
+import time
+import zlib
+import xml.etree.ElementTree as ET
+
+try:
+    import zstandard
+except ImportError:  # sem o zstandard os blobs são comprimidos com zlib
+    zstandard = None
+
+import db
+
+ARCHIVE_PATH = 'database/archive.db'
+
+ZSTD_LEVEL = 19
+ZLIB_LEVEL = 9
+
+# Dicionário de compressão com a marcação comum a toda NF-e: notas pequenas (NFC-e) quase
+# não se repetem internamente e comprimem muito melhor partindo dele. Nunca alterar o
+# conteúdo: blobs já gravados dependem dele (uma versão nova precisa de outro nome de codec)
+DICTIONARY = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<nfeProc xmlns="http://www.portalfiscal.inf.br/nfe" versao="4.00">'
+    '<NFe xmlns="http://www.portalfiscal.inf.br/nfe"><infNFe versao="4.00" Id="NFe">'
+    '<ide><cUF></cUF><cNF></cNF><natOp>VENDA DE MERCADORIA</natOp><mod>55</mod><serie>1</serie><nNF></nNF>'
+    '<dhEmi>-03:00</dhEmi><dhSaiEnt>-03:00</dhSaiEnt><tpNF>1</tpNF><idDest>1</idDest><cMunFG></cMunFG>'
+    '<tpImp>1</tpImp><tpEmis>1</tpEmis><cDV></cDV><tpAmb>1</tpAmb><finNFe>1</finNFe><indFinal>1</indFinal>'
+    '<indPres>1</indPres><procEmi>0</procEmi><verProc></verProc></ide>'
+    '<emit><CNPJ></CNPJ><xNome> LTDA</xNome><xFant></xFant><enderEmit><xLgr>RUA </xLgr><nro></nro>'
+    '<xBairro>CENTRO</xBairro><cMun></cMun><xMun></xMun><UF></UF><CEP></CEP><cPais>1058</cPais>'
+    '<xPais>BRASIL</xPais><fone></fone></enderEmit><IE></IE><CRT>3</CRT></emit>'
+    '<dest><CNPJ></CNPJ><CPF></CPF><xNome></xNome><enderDest><xLgr>RUA </xLgr><nro></nro><xBairro></xBairro>'
+    '<cMun></cMun><xMun></xMun><UF></UF><CEP></CEP><cPais>1058</cPais><xPais>BRASIL</xPais></enderDest>'
+    '<indIEDest>1</indIEDest><IE></IE><email></email></dest>'
+    '<det nItem="1"><prod><cProd></cProd><cEAN>SEM GTIN</cEAN><xProd></xProd><NCM></NCM><CEST></CEST>'
+    '<CFOP>5102</CFOP><uCom>UN</uCom><qCom>1.0000</qCom><vUnCom>0.00</vUnCom><vProd>0.00</vProd>'
+    '<cEANTrib>SEM GTIN</cEANTrib><uTrib>UN</uTrib><qTrib>1.0000</qTrib><vUnTrib>0.00</vUnTrib>'
+    '<vDesc>0.00</vDesc><indTot>1</indTot></prod><imposto><vTotTrib>0.00</vTotTrib>'
+    '<ICMS><ICMS00><orig>0</orig><CST>00</CST><modBC>3</modBC><vBC>0.00</vBC><pICMS>18.00</pICMS>'
+    '<vICMS>0.00</vICMS></ICMS00></ICMS><ICMS><ICMSSN102><orig>0</orig><CSOSN>102</CSOSN></ICMSSN102></ICMS>'
+    '<IPI><cEnq>999</cEnq><IPITrib><CST>50</CST><vBC>0.00</vBC><pIPI>0.00</pIPI><vIPI>0.00</vIPI></IPITrib></IPI>'
+    '<PIS><PISAliq><CST>01</CST><vBC>0.00</vBC><pPIS>1.65</pPIS><vPIS>0.00</vPIS></PISAliq></PIS>'
+    '<COFINS><COFINSAliq><CST>01</CST><vBC>0.00</vBC><pCOFINS>7.60</pCOFINS><vCOFINS>0.00</vCOFINS>'
+    '</COFINSAliq></COFINS></imposto></det>'
+    '<total><ICMSTot><vBC>0.00</vBC><vICMS>0.00</vICMS><vICMSDeson>0.00</vICMSDeson><vFCP>0.00</vFCP>'
+    '<vBCST>0.00</vBCST><vST>0.00</vST><vFCPST>0.00</vFCPST><vFCPSTRet>0.00</vFCPSTRet><vProd>0.00</vProd>'
+    '<vFrete>0.00</vFrete><vSeg>0.00</vSeg><vDesc>0.00</vDesc><vII>0.00</vII><vIPI>0.00</vIPI>'
+    '<vIPIDevol>0.00</vIPIDevol><vPIS>0.00</vPIS><vCOFINS>0.00</vCOFINS><vOutro>0.00</vOutro><vNF>0.00</vNF>'
+    '<vTotTrib>0.00</vTotTrib></ICMSTot></total><transp><modFrete>9</modFrete></transp>'
+    '<pag><detPag><indPag>0</indPag><tPag>01</tPag><vPag>0.00</vPag></detPag><vTroco>0.00</vTroco></pag>'
+    '<infAdic><infCpl></infCpl></infAdic></infNFe>'
+    '<Signature xmlns="http://www.w3.org/2000/09/xmldsig#"><SignedInfo>'
+    '<CanonicalizationMethod Algorithm="http://www.w3.org/TR/2001/REC-xml-c14n-20010315"/>'
+    '<SignatureMethod Algorithm="http://www.w3.org/2000/09/xmldsig#rsa-sha1"/><Reference URI="#NFe">'
+    '<Transforms><Transform Algorithm="http://www.w3.org/2000/09/xmldsig#enveloped-signature"/>'
+    '<Transform Algorithm="http://www.w3.org/TR/2001/REC-xml-c14n-20010315"/></Transforms>'
+    '<DigestMethod Algorithm="http://www.w3.org/2000/09/xmldsig#sha1"/><DigestValue></DigestValue>'
+    '</Reference></SignedInfo><SignatureValue></SignatureValue><KeyInfo><X509Data><X509Certificate>'
+    '</X509Certificate></X509Data></KeyInfo></Signature></NFe>'
+    '<protNFe versao="4.00"><infProt><tpAmb>1</tpAmb><verAplic></verAplic><chNFe></chNFe>'
+    '<dhRecbto>-03:00</dhRecbto><nProt></nProt><digVal></digVal><cStat>100</cStat>'
+    '<xMotivo>Autorizado o uso da NF-e</xMotivo></infProt></protNFe></nfeProc>'
+).encode('utf-8')
+
+ZLIB_CODEC = 'zlib+nfe1'
+ZSTD_CODEC = 'zstd+nfe1'
+
+
+def _zlib_compress(data):
+    compressor = zlib.compressobj(ZLIB_LEVEL, zdict=DICTIONARY)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _zlib_decompress(blob):
+    decompressor = zlib.decompressobj(zdict=DICTIONARY)
+    return decompressor.decompress(blob) + decompressor.flush()
+
+
+def _zstd_dictionary():
+    return zstandard.ZstdCompressionDict(DICTIONARY, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+
+
+def compress(data):
+    if zstandard is not None:
+        return ZSTD_CODEC, zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=_zstd_dictionary()).compress(data)
+    return ZLIB_CODEC, _zlib_compress(data)
+
+
+def decompress(codec, blob):
+    if codec == ZLIB_CODEC:
+        return _zlib_decompress(blob)
+    if codec == ZSTD_CODEC:
+        if zstandard is None:
+            raise RuntimeError("Este arquivo foi comprimido com zstd: instale o pacote zstandard.")
+        return zstandard.ZstdDecompressor(dict_data=_zstd_dictionary()).decompress(blob)
+    raise ValueError(f"Codec desconhecido: {codec}")
+
+
+def raw_digest(raw):
+    return hashlib.sha256(raw).hexdigest()
+
+
+def canonical_digest(raw):
+    # SHA-256 da forma canônica (C14N 2.0, sem espaços de formatação): o mesmo documento
+    # indentado, compacto ou com outra ordem de atributos tem o mesmo valor
+    canonical = ET.canonicalize(xml_data=raw, strip_text=True)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class Prepared:
+    # Trabalho pesado de um arquivo (hash e compressão), que pode rodar em outro processo.
+    # A forma canônica custa mais que o próprio parse: só é calculada (canonical=True) quando a
+    # chave já tem documento arquivado, o único caso em que pode haver o mesmo conteúdo com outros bytes
+    __slots__ = ('raw_sha256', 'canonical_sha256', 'size', 'codec', 'blob')
+
+    def __init__(self, raw, canonical=False):
+        self.raw_sha256 = raw_digest(raw)
+        self.canonical_sha256 = canonical_digest(raw) if canonical else None
+        self.size = len(raw)
+        self.codec, self.blob = compress(raw)
+
+    def canonical(self):
+        if self.canonical_sha256 is None:
+            self.canonical_sha256 = canonical_digest(decompress(self.codec, self.blob))
+        return self.canonical_sha256
+
+
+class Archived:
+    # Bytes já presentes no arquivo: endereço do documento e a chave a que ele pertence
+    __slots__ = ('sha256', 'chave')
+
+    def __init__(self, sha256, chave):
+        self.sha256 = sha256
+        self.chave = chave
+
+
+class XMLArchive:
+    # Arquivo de XMLs deduplicado: cada documento distinto é guardado uma única vez, comprimido,
+    # e ligado às chaves de acesso em que apareceu. Os hashes dos bytes exatos já vistos permitem
+    # reconhecer uma reimportação sem nem fazer o parse; outra formatação de um documento já
+    # arquivado é reconhecida pela forma canônica, comparada só entre documentos da mesma chave
+    def __init__(self, path=ARCHIVE_PATH, check_same_thread=True):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = db.connect(path, check_same_thread=check_same_thread)
+        self.create_tables()
+
+    def create_tables(self):
+        cursor = self.conn.cursor()
+        cursor.executescript('''
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                canonical_sha256 TEXT
+            );
+
+            CREATE TABLE IF NOT EXISTS documents (
+                chave TEXT NOT NULL,
+                sha256 TEXT NOT NULL REFERENCES blobs(sha256),
+                arquivado_em REAL NOT NULL,
+                PRIMARY KEY (chave, sha256)
+            );
+
+            CREATE TABLE IF NOT EXISTS raw_digests (
+                raw_sha256 TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL REFERENCES blobs(sha256)
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_documents_sha256 ON documents (sha256);
+        ''')
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(blobs)")}
+        if 'canonical_sha256' not in columns:
+            # Arquivos anteriores endereçavam todo blob pela forma canônica
+            cursor.execute("ALTER TABLE blobs ADD COLUMN canonical_sha256 TEXT")
+            cursor.execute("UPDATE blobs SET canonical_sha256 = sha256")
+        self.conn.commit()
+
+    def _known_digest(self, raw_sha256):
+        row = self.conn.execute("SELECT sha256 FROM raw_digests WHERE raw_sha256 = ?", (raw_sha256,)).fetchone()
+        return row[0] if row else None
+
+    def known_digest(self, raw_sha256):
+        # Endereço do conteúdo se estes bytes exatos já foram arquivados (ou None)
+        with self.lock:
+            return self._known_digest(raw_sha256)
+
+    def archived(self, raw_sha256):
+        # Archived se estes bytes exatos já foram arquivados com uma chave de acesso (ou None)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT r.sha256, d.chave FROM raw_digests r JOIN documents d ON d.sha256 = r.sha256 "
+                "WHERE r.raw_sha256 = ? LIMIT 1", (raw_sha256,)
+            ).fetchone()
+        return Archived(*row) if row else None
+
+    def has_chave(self, chave):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM documents WHERE chave = ? LIMIT 1", (chave,)).fetchone() is not None
+
+    def contains(self, raw):
+        return self.known_digest(raw_digest(raw)) is not None
+
+    def _match(self, prepared, chave):
+        # Endereço de um documento já arquivado para a chave com o mesmo conteúdo canônico (ou None).
+        # Chamado com o lock; blobs ainda sem forma canônica a recebem aqui
+        rows = self.conn.execute(
+            "SELECT b.sha256, b.canonical_sha256, b.codec, b.data FROM documents d "
+            "JOIN blobs b ON b.sha256 = d.sha256 WHERE d.chave = ?", (chave,)
+        ).fetchall()
+        if not rows:
+            return None
+        canonical = prepared.canonical()
+        for sha256, existing, codec, data in rows:
+            if existing is None:
+                existing = canonical_digest(decompress(codec, data))
+                self.conn.execute("UPDATE blobs SET canonical_sha256 = ? WHERE sha256 = ?", (existing, sha256))
+            if existing == canonical:
+                return sha256
+        return None
+
+    def is_archived(self, prepared, chave):
+        # O documento (estes bytes ou outra formatação do mesmo conteúdo) já está no arquivo
+        with self.lock, self.conn:
+            if self._known_digest(prepared.raw_sha256) is not None:
+                return True
+            return bool(chave) and self._match(prepared, chave) is not None
+
+    def put(self, prepared, chave=None):
+        # Retorna True se o conteúdo era novo no arquivo
+        return self.put_many([(prepared, chave)]) == 1
+
+    def put_many(self, documents):
+        # documents: (Prepared, chave). Uma transação para o lote; retorna quantos eram novos.
+        # Documento novo é endereçado pelo hash dos bytes; outra formatação de um já arquivado
+        # (mesma forma canônica, mesma chave) só liga os bytes ao blob existente
+        added = 0
+        now = time.time()
+        with self.lock, self.conn:
+            for prepared, chave in documents:
+                sha256 = self._known_digest(prepared.raw_sha256)
+                if sha256 is None and chave:
+                    sha256 = self._match(prepared, chave)
+                if sha256 is None:
+                    sha256 = prepared.raw_sha256
+                    cursor = self.conn.execute(
+                        "INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?, ?, ?)",
+                        (sha256, prepared.codec, prepared.size, len(prepared.blob), prepared.blob,
+                         prepared.canonical_sha256),
+                    )
+                    added += cursor.rowcount == 1
+                self.conn.execute("INSERT OR IGNORE INTO raw_digests VALUES (?, ?)", (prepared.raw_sha256, sha256))
+                if chave:
+                    self.conn.execute("INSERT OR IGNORE INTO documents VALUES (?, ?, ?)", (chave, sha256, now))
+        return added
+
+    def add(self, raw, chave=None):
+        # Arquiva os bytes de um XML; retorna False quando o documento já estava no arquivo
+        if isinstance(raw, str):
+            raw = raw.encode('utf-8')
+        if self.known_digest(raw_digest(raw)) is not None:
+            return False
+        return self.put(Prepared(raw, canonical=bool(chave) and self.has_chave(chave)), chave)
+
+    def get(self, sha256):
+        with self.lock:
+            row = self.conn.execute("SELECT codec, data FROM blobs WHERE sha256 = ?", (sha256,)).fetchone()
+        return decompress(*row) if row else None
+
+    def get_by_chave(self, chave):
+        # Versão mais recente arquivada para a chave de acesso
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT sha256 FROM documents WHERE chave = ? ORDER BY arquivado_em DESC LIMIT 1", (chave,)
+            ).fetchone()
+        return self.get(row[0]) if row else None
+
+    def stats(self):
+        with self.lock:
+            documents, size, stored_size = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM blobs"
+            ).fetchone()
+            variants = self.conn.execute("SELECT COUNT(*) FROM raw_digests").fetchone()[0]
+        return {'documentos': documents, 'variantes': variants, 'bytes': size, 'bytes_gravados': stored_size}
+
+    def close(self):
+        self.conn.close()
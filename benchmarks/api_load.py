@@ -0,0 +1,117 @@
+# Carga na API HTTP local (main.py serve): várias conexões keep-alive enviando NF-e sintéticas.
+# Sem --url sobe um servidor próprio (bancos temporários) só para o teste.
+# Uso: python -m benchmarks.api_load [--route parse|danfe|import] [--requests 500] [--concurrency 8]
+#      python -m benchmarks.api_load --url http://127.0.0.1:8080 --route danfe --items 100
+import argparse
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+from benchmarks.corpus import build_note
+from benchmarks.run import percentile
+
+ROUTES = ('parse', 'danfe', 'import')
+
+# Notas distintas enviadas em rodízio (a importação de uma nota repetida vira duplicata)
+DISTINCT_NOTES = 200
+
+
+def run_load(url, route, total, concurrency, items):
+    target = urlsplit(url)
+    bodies = [build_note(items, number=number + 1).encode('utf-8')
+              for number in range(min(total, DISTINCT_NOTES))]
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client():
+        connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=60)
+        local = []
+        local_statuses = Counter()
+        for index in counter:
+            body = bodies[index % len(bodies)]
+            start = time.perf_counter()
+            try:
+                connection.request('POST', f'/nfe/{route}', body, {'Content-Type': 'application/xml'})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+                if response.getheader('Connection', '').lower() == 'close':
+                    connection.close()
+            except (OSError, http.client.HTTPException):
+                status = 'falha'
+                connection.close()
+            local.append(time.perf_counter() - start)
+            local_statuses[status] += 1
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            statuses.update(local_statuses)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"{total} requisições POST /nfe/{route} ({items} itens) com {concurrency} conexões em {elapsed:.2f}s: "
+          f"{total / elapsed:.1f} req/s")
+    print(f"Latência no cliente: p50 {percentile(latencies, 0.50) * 1000:.1f} ms  "
+          f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms  p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+    print("Respostas: " + '  '.join(f"{status}: {count}" for status, count in sorted(statuses.items(), key=str)))
+
+    # Latências medidas pelo próprio servidor
+    connection = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=10)
+    connection.request('GET', '/metrics')
+    metrics = json.loads(connection.getresponse().read())
+    connection.close()
+    served = metrics['rotas'].get(f'/nfe/{route}')
+    if served:
+        print(f"Latência no servidor: p50 {served['p50_ms']:.1f} ms  p95 {served['p95_ms']:.1f} ms  "
+              f"p99 {served['p99_ms']:.1f} ms  (recusadas: {metrics['recusadas']})")
+    return statuses
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help="Servidor já em execução (padrão: sobe um local)")
+    parser.add_argument('--route', choices=ROUTES, default='parse')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--items', type=int, default=10, help="Itens por nota")
+    parser.add_argument('--workers', type=int, default=None, help="Processos do servidor local")
+    args = parser.parse_args()
+
+    if args.url:
+        statuses = run_load(args.url, args.route, args.requests, args.concurrency, args.items)
+    else:
+        import api
+        import archive
+        import storage
+
+        with tempfile.TemporaryDirectory() as directory:
+            store = storage.NoteStore(os.path.join(directory, 'notes.db'))
+            xml_archive = archive.XMLArchive(os.path.join(directory, 'archive.db'), check_same_thread=False)
+            server = api.start_server(port=0, workers=args.workers, store=store, xml_archive=xml_archive)
+            try:
+                statuses = run_load(f'http://127.0.0.1:{server.server_port}', args.route, args.requests,
+                                    args.concurrency, args.items)
+            finally:
+                server.shutdown()
+                server.server_close()
+                store.close()
+                xml_archive.close()
+    return 1 if any(status == 'falha' or status >= 500 for status in statuses if status != 503) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
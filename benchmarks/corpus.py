@@ -0,0 +1,144 @@
+# Gera NF-e 4.00 sintéticas (estrutura completa, chave com dígito verificador válido) para benchmarks.
+# Uso: python -m benchmarks.corpus --out corpus/ --count 100 --items 1 10 100 1000
+import argparse
+import os
+import random
+from xml.sax.saxutils import escape
+
+NFE_NS = 'http://www.portalfiscal.inf.br/nfe'
+
+UFS = {'SP': ('35', '3550308', 'Sao Paulo'), 'RJ': ('33', '3304557', 'Rio de Janeiro'),
+       'MG': ('31', '3106200', 'Belo Horizonte'), 'RS': ('43', '4314902', 'Porto Alegre'),
+       'PR': ('41', '4106902', 'Curitiba'), 'SC': ('42', '4205407', 'Florianopolis')}
+NCMS = ('10063021', '07133399', '04012010', '15079011', '17019900', '22021000', '19053100', '09012100')
+CFOPS = ('5102', '5405', '6102', '6108', '5101')
+PRODUTOS = ('Arroz tipo 1', 'Feijao carioca', 'Leite integral', 'Oleo de soja', 'Acucar cristal',
+            'Refrigerante cola', 'Biscoito recheado', 'Cafe torrado')
+
+
+def _dv_mod11(digits):
+    # Dígito verificador da chave de acesso (módulo 11, pesos 2 a 9)
+    total = sum(int(d) * (2 + i % 8) for i, d in enumerate(reversed(digits)))
+    dv = 11 - total % 11
+    return '0' if dv >= 10 else str(dv)
+
+
+def _cnpj(rng):
+    base = ''.join(str(rng.randrange(10)) for _ in range(8)) + '0001'
+    for _ in range(2):
+        weights = list(range(len(base) - 7, 1, -1)) + list(range(9, 1, -1))
+        total = sum(int(d) * w for d, w in zip(base, weights))
+        dv = 11 - total % 11
+        base += '0' if dv >= 10 else str(dv)
+    return base
+
+
+def _money(cents):
+    return f"{cents // 100}.{cents % 100:02d}"
+
+
+def _party(tag, ender_tag, rng, cnpj, uf):
+    c_uf, c_mun, x_mun = UFS[uf]
+    return (
+        f'<{tag}><CNPJ>{cnpj}</CNPJ><xNome>{escape(rng.choice(("Comercial", "Distribuidora", "Atacado", "Mercado")))} '
+        f'{rng.randrange(1000, 9999)} LTDA</xNome>'
+        f'<{ender_tag}><xLgr>Rua {rng.randrange(1, 500)} de Maio</xLgr><nro>{rng.randrange(1, 3000)}</nro>'
+        f'<xBairro>Centro</xBairro><cMun>{c_mun}</cMun><xMun>{x_mun}</xMun><UF>{uf}</UF>'
+        f'<CEP>{rng.randrange(10000000, 99999999)}</CEP><cPais>1058</cPais><xPais>BRASIL</xPais></{ender_tag}>'
+        f'<IE>{rng.randrange(10**11, 10**12)}</IE></{tag}>'
+    )
+
+
+def build_note(items, number=1, seed=None):
+    rng = random.Random(seed if seed is not None else number)
+    uf_emit = rng.choice(sorted(UFS))
+    uf_dest = rng.choice(sorted(UFS))
+    c_uf = UFS[uf_emit][0]
+    cnpj_emit = _cnpj(rng)
+    cnpj_dest = _cnpj(rng)
+    month = rng.randrange(1, 13)
+    day = rng.randrange(1, 29)
+    aamm = f"24{month:02d}"
+    c_nf = f"{rng.randrange(10**8):08d}"
+    chave = f"{c_uf}{aamm}{cnpj_emit}55001{number:09d}1{c_nf}"
+    chave += _dv_mod11(chave)
+
+    det = []
+    totals = dict.fromkeys(('vProd', 'vICMS', 'vPIS', 'vCOFINS', 'vIPI'), 0)
+    for n in range(1, items + 1):
+        qty = rng.randrange(1, 500)
+        unit = rng.randrange(50, 50000)
+        v_prod = qty * unit
+        v_icms = v_prod * 18 // 100
+        v_ipi = v_prod * 5 // 100
+        v_pis = v_prod * 165 // 10000
+        v_cofins = v_prod * 760 // 10000
+        for key, value in (('vProd', v_prod), ('vICMS', v_icms), ('vIPI', v_ipi), ('vPIS', v_pis), ('vCOFINS', v_cofins)):
+            totals[key] += value
+        det.append(
+            f'<det nItem="{n}"><prod><cProd>{n:06d}</cProd><cEAN>SEM GTIN</cEAN>'
+            f'<xProd>{rng.choice(PRODUTOS)} {rng.randrange(1, 5)}kg</xProd><NCM>{rng.choice(NCMS)}</NCM>'
+            f'<CFOP>{rng.choice(CFOPS)}</CFOP><uCom>UN</uCom><qCom>{qty}.0000</qCom>'
+            f'<vUnCom>{_money(unit)}</vUnCom><vProd>{_money(v_prod)}</vProd><cEANTrib>SEM GTIN</cEANTrib>'
+            f'<uTrib>UN</uTrib><qTrib>{qty}.0000</qTrib><vUnTrib>{_money(unit)}</vUnTrib><indTot>1</indTot></prod>'
+            f'<imposto><ICMS><ICMS00><orig>0</orig><CST>00</CST><modBC>3</modBC><vBC>{_money(v_prod)}</vBC>'
+            f'<pICMS>18.00</pICMS><vICMS>{_money(v_icms)}</vICMS></ICMS00></ICMS>'
+            f'<IPI><cEnq>999</cEnq><IPITrib><CST>50</CST><vBC>{_money(v_prod)}</vBC><pIPI>5.00</pIPI>'
+            f'<vIPI>{_money(v_ipi)}</vIPI></IPITrib></IPI>'
+            f'<PIS><PISAliq><CST>01</CST><vBC>{_money(v_prod)}</vBC><pPIS>1.65</pPIS><vPIS>{_money(v_pis)}</vPIS></PISAliq></PIS>'
+            f'<COFINS><COFINSAliq><CST>01</CST><vBC>{_money(v_prod)}</vBC><pCOFINS>7.60</pCOFINS>'
+            f'<vCOFINS>{_money(v_cofins)}</vCOFINS></COFINSAliq></COFINS></imposto></det>'
+        )
+
+    v_nf = totals['vProd'] + totals['vIPI']
+    return (
+        f'<?xml version="1.0" encoding="UTF-8"?>'
+        f'<nfeProc xmlns="{NFE_NS}" versao="4.00"><NFe xmlns="{NFE_NS}"><infNFe Id="NFe{chave}" versao="4.00">'
+        f'<ide><cUF>{c_uf}</cUF><cNF>{c_nf}</cNF><natOp>Venda de mercadoria</natOp><mod>55</mod><serie>1</serie>'
+        f'<nNF>{number}</nNF><dhEmi>2024-{month:02d}-{day:02d}T10:{rng.randrange(60):02d}:00-03:00</dhEmi>'
+        f'<tpNF>1</tpNF><idDest>1</idDest><cMunFG>{UFS[uf_emit][1]}</cMunFG><tpImp>1</tpImp><tpEmis>1</tpEmis>'
+        f'<cDV>{chave[-1]}</cDV><tpAmb>1</tpAmb><finNFe>1</finNFe><indFinal>0</indFinal><indPres>1</indPres>'
+        f'<procEmi>0</procEmi><verProc>1.0</verProc></ide>'
+        + _party('emit', 'enderEmit', rng, cnpj_emit, uf_emit)
+        + _party('dest', 'enderDest', rng, cnpj_dest, uf_dest)
+        + ''.join(det)
+        + f'<total><ICMSTot><vBC>{_money(totals["vProd"])}</vBC><vICMS>{_money(totals["vICMS"])}</vICMS>'
+        f'<vProd>{_money(totals["vProd"])}</vProd><vIPI>{_money(totals["vIPI"])}</vIPI>'
+        f'<vPIS>{_money(totals["vPIS"])}</vPIS><vCOFINS>{_money(totals["vCOFINS"])}</vCOFINS>'
+        f'<vNF>{_money(v_nf)}</vNF></ICMSTot></total>'
+        f'<transp><modFrete>9</modFrete></transp>'
+        f'<pag><detPag><tPag>01</tPag><vPag>{_money(v_nf)}</vPag></detPag></pag>'
+        f'<infAdic><infCpl>Documento sintetico para benchmark</infCpl></infAdic>'
+        f'</infNFe></NFe>'
+        f'<protNFe versao="4.00"><infProt><tpAmb>1</tpAmb><verAplic>SP_NFE_PL009_V4</verAplic><chNFe>{chave}</chNFe>'
+        f'<dhRecbto>2024-{month:02d}-{day:02d}T10:30:00-03:00</dhRecbto><nProt>1{number:014d}</nProt>'
+        f'<cStat>100</cStat><xMotivo>Autorizado o uso da NF-e</xMotivo></infProt></protNFe></nfeProc>'
+    )
+
+
+def write_corpus(output_dir, count, items, seed=0):
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    rng = random.Random(seed)
+    for number in range(1, count + 1):
+        xml_content = build_note(rng.choice(items), number, seed=seed * 1_000_003 + number)
+        path = os.path.join(output_dir, f"nfe-{number:06d}.xml")
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(xml_content)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', required=True, help="Diretório de saída")
+    parser.add_argument('--count', type=int, default=100, help="Número de notas")
+    parser.add_argument('--items', type=int, nargs='+', default=[1, 10, 100], help="Itens por nota (sorteado entre os valores)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    paths = write_corpus(args.out, args.count, args.items, args.seed)
+    print(f"{len(paths)} notas geradas em {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# Servidor HTTP local que imita a consulta da SEFAZ, para exercitar o cliente sem rede.
+# Uso: python -m benchmarks.fake_sefaz [--port 8765] [--fail-first 2] [--delay 0.05]
+#      SEFAZ: http://127.0.0.1:8765/<qualquer caminho> devolve uma NF-e
+import argparse
+import email.utils
+import gzip
+import hashlib
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.corpus import build_note
+
+
+class FakeSefazHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Cabeçalho e corpo saem num único envio (evita o atraso do ACK retardado)
+    wbufsize = -1
+
+    def setup(self):
+        super().setup()
+        self.server.stats['connections'] += 1
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.stats['requests'] += 1
+            server.attempts[self.path] += 1
+            attempt = server.attempts[self.path]
+
+        if server.delay:
+            time.sleep(server.delay)
+
+        if attempt <= server.fail_first:
+            # Simula instabilidade: as primeiras tentativas de cada caminho falham
+            self._send(503, b'Servico indisponivel', 'text/plain')
+            return
+
+        if self.headers.get('If-None-Match') == server.etag:
+            self._send(304, b'', None)
+            return
+
+        body = server.body
+        encoding = None
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = server.body_gzip
+            encoding = 'gzip'
+            with server.lock:
+                server.stats['gzip'] += 1
+        self._send(200, body, 'application/xml; charset=utf-8', encoding)
+
+    def _send(self, status, body, content_type, encoding=None):
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', self.server.etag)
+        self.send_header('Last-Modified', self.server.last_modified)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, items=10, fail_first=0, delay=0.0):
+    # Sobe o servidor numa thread; port=0 escolhe uma porta livre (server.server_port)
+    server = ThreadingHTTPServer(('127.0.0.1', port), FakeSefazHandler)
+    server.daemon_threads = True
+    server.body = build_note(items).encode('utf-8')
+    server.body_gzip = gzip.compress(server.body)
+    server.etag = '"%s"' % hashlib.sha256(server.body).hexdigest()[:16]
+    server.last_modified = email.utils.formatdate(usegmt=True)
+    server.fail_first = fail_first
+    server.delay = delay
+    server.lock = threading.Lock()
+    server.attempts = Counter()
+    server.stats = Counter()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--items', type=int, default=10)
+    parser.add_argument('--fail-first', type=int, default=0, help="Respostas 503 antes do sucesso, por caminho")
+    parser.add_argument('--delay', type=float, default=0.0, help="Latência artificial por requisição (s)")
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.items, args.fail_first, args.delay)
+    print(f"SEFAZ local em http://127.0.0.1:{server.server_port}/ (Ctrl+C para sair)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(dict(server.stats))
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+# Compara o formatador em streaming (pretty.py) com o caminho antigo via xml.dom.minidom.
+# Uso: python -m benchmarks.pretty_bench [--items 100 1000 10000] [--repeat 3]
+import argparse
+import time
+import xml.dom.minidom
+
+import pretty
+from benchmarks.corpus import build_note
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, nargs='+', default=[10, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'itens':>8} {'MB':>8} {'minidom (s)':>12} {'pretty (s)':>12} {'ganho':>7}")
+    for items in args.items:
+        xml_content = build_note(items)
+        old = best_of(lambda: xml.dom.minidom.parseString(xml_content).toprettyxml(), args.repeat)
+        new = best_of(lambda: pretty.pretty_xml(xml_content), args.repeat)
+        print(f"{items:>8} {len(xml_content) / 1e6:>8.2f} {old:>12.4f} {new:>12.4f} {old / new:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# Suíte de benchmarks offline: parse, formatação e DANFE sobre NF-e sintéticas.
+# Cada caso (etapa x tamanho) roda num processo novo, para medir o pico de memória isolado.
+# Uso: python -m benchmarks.run [--items 1 100 1000 10000] [--repeat 20] [--output resultado.json]
+#      python -m benchmarks.run --compare antes.json depois.json
+import argparse
+import io
+import json
+import math
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmarks.corpus import build_note
+
+STAGES = ('parse', 'pretty', 'danfe')
+
+
+def _stage_function(stage):
+    if stage == 'parse':
+        import nfe
+        return nfe.parse_nfe
+    if stage == 'pretty':
+        import pretty
+        return pretty.pretty_xml
+    if stage == 'danfe':
+        import danfe
+        import nfe
+
+        def render(xml_content):
+            danfe.generate_danfe(nfe.parse_nfe(xml_content), io.BytesIO())
+        return render
+    raise ValueError(f"Etapa desconhecida: {stage}")
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(values, fraction):
+    # Percentil pelo método do posto mais próximo
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def run_case(stage, items, repeat):
+    func = _stage_function(stage)
+    xml_content = build_note(items)
+    func(xml_content)  # aquecimento (imports, caches)
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(xml_content)
+        timings.append(time.perf_counter() - start)
+
+    # Sem o módulo resource (Windows) mede o pico de alocações do Python numa execução extra
+    peak_alloc = None
+    if resource is None:
+        tracemalloc.start()
+        func(xml_content)
+        peak_alloc = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+
+    return {
+        'stage': stage,
+        'items': items,
+        'bytes': len(xml_content.encode('utf-8')),
+        'runs': repeat,
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p95_ms': percentile(timings, 0.95) * 1000,
+        'mean_ms': sum(timings) / len(timings) * 1000,
+        'peak_rss_mb': _peak_rss_mb(),
+        'peak_alloc_mb': peak_alloc,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(stages, sizes, repeat):
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for stage in stages:
+        for items in sizes:
+            # Execuções menores para notas enormes, para a suíte terminar em tempo razoável
+            runs = max(3, repeat // max(1, items // 1000))
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(run_case, stage, items, runs).result()
+            results.append(result)
+            print(f"{stage:>7} {items:>6} itens  p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+                  f"pico {result['peak_rss_mb'] or result['peak_alloc_mb'] or 0:7.1f} MB")
+    return {
+        'commit': _git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+    }
+
+
+def compare(before_path, after_path):
+    with open(before_path) as file:
+        before = {(r['stage'], r['items']): r for r in json.load(file)['results']}
+    with open(after_path) as file:
+        after = json.load(file)['results']
+
+    print(f"{'etapa':>7} {'itens':>6} {'p50 antes':>10} {'p50 depois':>11} {'variação':>9}")
+    for result in after:
+        old = before.get((result['stage'], result['items']))
+        if old is None:
+            continue
+        change = (result['p50_ms'] / old['p50_ms'] - 1) * 100
+        print(f"{result['stage']:>7} {result['items']:>6} {old['p50_ms']:>10.2f} {result['p50_ms']:>11.2f} {change:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--items', type=int, nargs='+', default=[1, 100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help="Grava os resultados em JSON")
+    parser.add_argument('--compare', nargs=2, metavar=('ANTES', 'DEPOIS'), help="Compara dois resultados JSON")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run_suite(args.stages, args.items, args.repeat)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Resultados gravados em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
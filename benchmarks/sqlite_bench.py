@@ -0,0 +1,67 @@
+# Gravação em massa de notas no SQLite: perfil padrão do sqlite3 (journal de rollback,
+# synchronous=FULL) contra o perfil do programa (db.PRAGMAS: WAL, synchronous=NORMAL, cache, mmap),
+# com um commit por nota e em lotes.
+# Uso: python -m benchmarks.sqlite_bench [--notes 2000] [--items 10] [--batch 500] [--dir .]
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.corpus import build_note
+
+PROFILES = ('padrao', 'ajustado')
+MODES = ('por_nota', 'lote')
+
+
+def _rows(notes):
+    # Linhas gravadas por nota: nota, duas partes, itens e a linha da busca textual
+    return sum(4 + len(data.produtos) for data in notes)
+
+
+def run_case(directory, notes, profile, mode, batch):
+    import storage
+
+    path = os.path.join(directory, f'{profile}-{mode}.db')
+    store = storage.NoteStore(path, pragmas={} if profile == 'padrao' else None)
+    start = time.perf_counter()
+    if mode == 'por_nota':
+        for data in notes:
+            store.save_note(data)
+    else:
+        for index in range(0, len(notes), batch):
+            store.save_notes(notes[index:index + batch])
+    elapsed = time.perf_counter() - start
+    store.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--notes', type=int, default=2000)
+    parser.add_argument('--items', type=int, default=10, help="Itens por nota")
+    parser.add_argument('--batch', type=int, default=500, help="Notas por transação no modo em lote")
+    parser.add_argument('--dir', default='.', help="Onde criar os bancos temporários (use o disco real, não tmpfs)")
+    args = parser.parse_args()
+
+    import nfe
+
+    notes = [nfe.parse_nfe(build_note(args.items, number=number + 1)) for number in range(args.notes)]
+    rows = _rows(notes)
+    print(f"{args.notes} notas, {rows} linhas por execução")
+
+    results = {}
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        for profile in PROFILES:
+            for mode in MODES:
+                elapsed = run_case(directory, notes, profile, mode, args.batch)
+                results[profile, mode] = elapsed
+                print(f"{profile:>9} {mode:>9}  {elapsed:7.2f}s  {args.notes / elapsed:9.0f} notas/s  "
+                      f"{rows / elapsed:10.0f} linhas/s")
+
+    before = results['padrao', 'por_nota']
+    after = results['ajustado', 'lote']
+    print(f"Commit por nota no perfil padrão -> lotes no perfil ajustado: {before / after:.1f}x mais rápido")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# Tempo de abertura: importa cada módulo num interpretador novo com -X importtime e soma o
+# tempo de import (mediana de várias execuções), listando os maiores responsáveis.
+# 'main' é o que a janela de login espera antes de aparecer.
+# Uso: python -m benchmarks.startup [--modules main cli watcher] [--repeat 5] [--output abertura.json]
+#      python -m benchmarks.startup --compare antes.json depois.json
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmarks.run import _git_commit
+
+MODULES = ('main', 'cli', 'watcher', 'report', 'nfe')
+
+# Pilhas que não devem ser carregadas na abertura do programa
+HEAVY_MODULES = ('requests', 'reportlab', 'numpy', 'PIL', 'xml.dom.minidom')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(output):
+    # Linhas 'import time: <própria> | <acumulada> | <módulo>', em microssegundos; a indentação
+    # do nome indica quem importou quem (sem indentação: import direto do comando)
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # cabeçalho
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), depth, int(fields[0]), int(fields[1])))
+    return modules
+
+
+def measure(module):
+    # Um interpretador novo por medição: nada vem do cache de módulos da execução anterior
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                             cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if process.returncode:
+        error = process.stderr.strip().splitlines()
+        raise RuntimeError(error[-1] if error else f"código {process.returncode}")
+    modules = parse_importtime(process.stderr)
+    # Os filhos aparecem antes do pai: os de nível 1 desde a última linha de nível 0 são do módulo
+    own = 0
+    children = []
+    pending = []
+    for name, depth, _, cumulative in modules:
+        if depth == 1:
+            pending.append((cumulative, name))
+        elif depth == 0:
+            if name == module:
+                own, children = cumulative, pending
+            pending = []
+    return wall, own, children, modules
+
+
+def run_module(module, repeat, top):
+    walls = []
+    totals = []
+    children = modules = []
+    for _ in range(repeat):
+        wall, own, children, modules = measure(module)
+        walls.append(wall)
+        totals.append(own)
+
+    loaded = {name for name, _, _, _ in modules}
+    heavy = [name for name in HEAVY_MODULES if name in loaded]
+    # Maiores importações diretas do módulo medido (filhos imediatos na árvore)
+    children = sorted(children, reverse=True)
+    return {
+        'module': module,
+        'runs': repeat,
+        'import_ms': statistics.median(totals) / 1000,
+        'process_ms': statistics.median(walls) * 1000,
+        'modules_loaded': len(loaded),
+        'heavy_loaded': heavy,
+        'top': [{'module': name, 'ms': cumulative / 1000} for cumulative, name in children[:top]],
+    }
+
+
+def run_suite(modules, repeat, top):
+    # Referência: interpretador que não importa nada além do próprio site
+    baseline = statistics.median(measure('sys')[0] for _ in range(repeat)) * 1000
+    print(f"{'interpretador vazio':>20}  processo {baseline:7.1f} ms")
+
+    results = []
+    for module in modules:
+        try:
+            result = run_module(module, repeat, top)
+        except RuntimeError as e:
+            print(f"{module:>20}  erro: {e}", file=sys.stderr)
+            continue
+        results.append(result)
+        heavy = ', '.join(result['heavy_loaded']) or '-'
+        print(f"{module:>20}  import {result['import_ms']:7.1f} ms  processo {result['process_ms']:7.1f} ms  "
+              f"{result['modules_loaded']:4d} módulos  pesados: {heavy}")
+        for entry in result['top']:
+            print(f"{'':>24}{entry['ms']:7.1f} ms  {entry['module']}")
+    return {
+        'commit': _git_commit(),
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'baseline_ms': baseline,
+        'results': results,
+    }
+
+
+def compare(before_path, after_path):
+    with open(before_path) as file:
+        before = {r['module']: r for r in json.load(file)['results']}
+    with open(after_path) as file:
+        after = json.load(file)['results']
+
+    print(f"{'módulo':>10} {'antes':>9} {'depois':>9} {'variação':>9}")
+    for result in after:
+        old = before.get(result['module'])
+        if old is None or not old['import_ms']:
+            continue
+        change = (result['import_ms'] / old['import_ms'] - 1) * 100
+        print(f"{result['module']:>10} {old['import_ms']:>9.1f} {result['import_ms']:>9.1f} {change:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--modules', nargs='+', default=list(MODULES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=5, help="Maiores importações listadas por módulo")
+    parser.add_argument('--output', help="Grava os resultados em JSON")
+    parser.add_argument('--compare', nargs=2, metavar=('ANTES', 'DEPOIS'), help="Compara dois resultados JSON")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    report = run_suite(args.modules, args.repeat, args.top)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"Resultados gravados em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
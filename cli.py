@@ -0,0 +1,616 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import archive
+import importer
+import nfe
+import pretty
+import report
+import shards
+import sources
+import storage
+from model import format_cents
+
+# danfe (ReportLab) e sefaz (requests) são importados só pelos comandos que os usam:
+# os outros comandos, e os processos do pool que não geram PDF, abrem sem carregá-los
+
+
+def find_xml_files(targets):
+    files = []
+    for target in targets:
+        if os.path.isdir(target):
+            files.extend(glob.glob(os.path.join(target, '**', '*.xml'), recursive=True))
+        else:
+            files.extend(glob.glob(target, recursive=True))
+    return sorted(set(files))
+
+
+def open_store(args):
+    # --shards grava um arquivo por mês de emissão (shards.ShardedNoteStore) em vez do banco único
+    if getattr(args, 'shards', None):
+        return shards.ShardedNoteStore(args.shards)
+    return storage.NoteStore(args.db) if args.db else None
+
+
+def run_import(args):
+    inputs = sources.find_inputs(args.targets)
+    if not inputs:
+        print("Nenhum arquivo XML ou pacote ZIP/TAR encontrado.", file=sys.stderr)
+        return 1
+    if args.pdf_dir:
+        os.makedirs(args.pdf_dir, exist_ok=True)
+
+    store = open_store(args)
+    xml_archive = archive.XMLArchive(args.archive) if args.archive else None
+
+    def show_error(totals, name, error):
+        if error:
+            print(f"Erro em {name}: {error}", file=sys.stderr)
+
+    start = time.perf_counter()
+    try:
+        totals = importer.import_sources(sources.iter_sources(inputs), store, xml_archive, args.pdf_dir, args.workers,
+                                on_result=show_error)
+    finally:
+        if store:
+            store.close()
+        if xml_archive:
+            xml_archive.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"{totals['importados']} de {totals['arquivos']} arquivos importados ({totals['itens']} itens) em {elapsed:.2f}s")
+    if totals['duplicados']:
+        print(f"{totals['duplicados']} já estavam importados e foram ignorados")
+    print(f"Vazão: {totals['arquivos'] / elapsed:.1f} arquivos/s, {totals['bytes'] / elapsed / 1e6:.2f} MB/s")
+    return 1 if totals['erros'] else 0
+
+
+def pretty_one(file_path, output_path):
+    size = os.path.getsize(file_path)
+    # Escreve num arquivo temporário e troca no final, para não perder o original em caso de erro
+    temp_path = output_path + '.tmp'
+    try:
+        pretty.pretty_file(file_path, temp_path)
+        os.replace(temp_path, output_path)
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        return file_path, size, f"{type(e).__name__}: {e}"
+    return file_path, size, None
+
+
+def run_pretty(args):
+    files = find_xml_files(args.targets)
+    if not files:
+        print("Nenhum arquivo XML encontrado.", file=sys.stderr)
+        return 1
+
+    if args.output_dir:
+        base = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in files])
+        outputs = [os.path.join(args.output_dir, os.path.relpath(os.path.abspath(f), base)) for f in files]
+        for output_dir in {os.path.dirname(path) for path in outputs}:
+            os.makedirs(output_dir, exist_ok=True)
+    else:
+        outputs = files
+
+    total_bytes = 0
+    errors = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        chunksize = max(1, len(files) // ((args.workers or os.cpu_count() or 1) * 8))
+        for file_path, size, error in pool.map(pretty_one, files, outputs, chunksize=chunksize):
+            total_bytes += size
+            if error:
+                errors += 1
+                print(f"Erro em {file_path}: {error}", file=sys.stderr)
+
+    elapsed = time.perf_counter() - start
+    print(f"{len(files) - errors} de {len(files)} arquivos formatados em {elapsed:.2f}s")
+    print(f"Vazão: {len(files) / elapsed:.1f} arquivos/s, {total_bytes / elapsed / 1e6:.2f} MB/s")
+    return 1 if errors else 0
+
+
+def render_file(file_path, output_dir):
+    # Parse e renderização no mesmo processo: só o resumo volta para o processo principal
+    import danfe
+    try:
+        data = nfe.parse_nfe(file_path)
+        name = danfe.danfe_file_name(data, 0) if data.chave else os.path.splitext(os.path.basename(file_path))[0] + '.pdf'
+        return file_path, danfe.render_one(data, os.path.join(output_dir, name)), None
+    except Exception as e:
+        return file_path, None, f"{type(e).__name__}: {e}"
+
+
+def run_danfe(args):
+    import danfe
+    files = find_xml_files(args.targets)
+    if not files:
+        print("Nenhum arquivo XML encontrado.", file=sys.stderr)
+        return 1
+
+    timings = []
+    errors = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        chunksize = max(1, len(files) // ((args.workers or os.cpu_count() or 1) * 8))
+        if args.merge:
+            notes = []
+            for file_path, size, data, prepared, error in pool.map(importer.import_file, files, chunksize=chunksize):
+                if error:
+                    errors += 1
+                    print(f"Erro em {file_path}: {error}", file=sys.stderr)
+                else:
+                    notes.append(data)
+            timings, save_time = danfe.render_merged(notes, args.merge)
+            print(f"PDF único gravado em {args.merge} (gravação: {save_time:.2f}s)")
+        else:
+            os.makedirs(args.output_dir, exist_ok=True)
+            results = pool.map(render_file, files, [args.output_dir] * len(files), chunksize=chunksize)
+            for file_path, timing, error in results:
+                if error:
+                    errors += 1
+                    print(f"Erro em {file_path}: {error}", file=sys.stderr)
+                else:
+                    timings.append(timing)
+
+    elapsed = time.perf_counter() - start
+    pages = sum(timing[1] for timing in timings)
+    render_time = sum(timing[2] for timing in timings)
+    print(f"{len(timings)} DANFEs ({pages} páginas) em {elapsed:.2f}s")
+    if pages:
+        print(f"Renderização: {render_time:.2f}s de CPU, {render_time / pages * 1000:.1f} ms/página")
+
+    if args.timings:
+        with open(args.timings, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['chave', 'paginas', 'segundos', 'ms_por_pagina'])
+            for chave, doc_pages, seconds in timings:
+                writer.writerow([chave, doc_pages, f"{seconds:.6f}", f"{seconds / doc_pages * 1000:.3f}"])
+    return 1 if errors else 0
+
+
+def run_report(args):
+    files = find_xml_files(args.targets)
+    if not files:
+        print("Nenhum arquivo XML encontrado.", file=sys.stderr)
+        return 1
+
+    notes = []
+    errors = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        chunksize = max(1, len(files) // ((args.workers or os.cpu_count() or 1) * 8))
+        for file_path, size, data, prepared, error in pool.map(importer.import_file, files, chunksize=chunksize):
+            if error:
+                errors += 1
+                print(f"Erro em {file_path}: {error}", file=sys.stderr)
+            else:
+                notes.append(data)
+    parse_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = report.ItemTable.from_notes(notes)
+    rows = table.group_by(*args.by)
+    aggregate_time = time.perf_counter() - start
+
+    header = list(args.by) + ['itens'] + [report.VALUE_LABELS[name] for name in report.VALUE_COLUMNS]
+    if args.csv:
+        with open(args.csv, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            for row in rows:
+                labels = row[:len(args.by) + 1]
+                writer.writerow(list(labels) + [format_cents(value) for value in row[len(args.by) + 1:]])
+        print(f"{len(rows)} linhas gravadas em {args.csv}")
+    else:
+        print(';'.join(header))
+        for row in rows[:args.limit]:
+            labels = row[:len(args.by) + 1]
+            print(';'.join([str(label) for label in labels] + [format_cents(value) for value in row[len(args.by) + 1:]]))
+
+    print(f"{len(notes)} notas, {len(table)} itens: leitura {parse_time:.2f}s, agregação {aggregate_time:.3f}s",
+          file=sys.stderr)
+    return 1 if errors else 0
+
+
+def run_archive(args):
+    xml_archive = archive.XMLArchive(args.archive)
+    stats = xml_archive.stats()
+    xml_archive.close()
+    ratio = stats['bytes'] / stats['bytes_gravados'] if stats['bytes_gravados'] else 0
+    print(f"{stats['documentos']} documentos distintos ({stats['variantes']} variantes de arquivo)")
+    print(f"{stats['bytes'] / 1e6:.2f} MB de XML em {stats['bytes_gravados'] / 1e6:.2f} MB ({ratio:.1f}x)")
+    return 0
+
+
+def run_watch(args):
+    # Importado aqui: só o comando watch carrega o watchdog
+    import watcher
+
+    if args.pdf_dir:
+        os.makedirs(args.pdf_dir, exist_ok=True)
+    store = open_store(args)
+    xml_archive = archive.XMLArchive(args.archive) if args.archive else None
+    folder_watcher = watcher.FolderWatcher(
+        args.directory, store, xml_archive, args.pdf_dir, watcher.ProcessedFiles(args.state or watcher.STATE_PATH),
+        settle=args.settle if args.settle is not None else watcher.SETTLE_SECONDS, poll_interval=args.interval, workers=args.workers,
+    )
+    last_report = [0.0]
+
+    def report_status(current):
+        if time.monotonic() - last_report[0] >= args.report_every:
+            last_report[0] = time.monotonic()
+            metrics = current.metrics()
+            print(f"processados {metrics['processados']}  duplicados {metrics['duplicados']}  "
+                  f"erros {metrics['erros']}  na fila {metrics['backlog']}  "
+                  f"{metrics['arquivos_por_segundo']:.1f} arquivos/s", flush=True)
+
+    print(f"Monitorando {args.directory} (Ctrl+C para sair)")
+    try:
+        folder_watcher.run(metrics_path=args.metrics, on_cycle=report_status)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        folder_watcher.state.close()
+        if store:
+            store.close()
+        if xml_archive:
+            xml_archive.close()
+    return 0
+
+
+def run_serve(args):
+    import api
+
+    store = open_store(args)
+    xml_archive = archive.XMLArchive(args.archive, check_same_thread=False) if args.archive and store else None
+    server = api.NFeServer((args.host, args.port), args.workers, store, xml_archive)
+    print(f"Servindo em http://{args.host}:{server.server_port} (Ctrl+C para sair)")
+    print("POST /nfe/parse (JSON), /nfe/danfe (PDF), /nfe/import; GET /metrics, /health")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if store:
+            store.close()
+        if xml_archive:
+            xml_archive.close()
+    return 0
+
+
+def run_queue_add(args):
+    import jobqueue
+
+    inputs = sources.find_inputs(args.targets)
+    if not inputs:
+        print("Nenhum arquivo XML encontrado.", file=sys.stderr)
+        return 1
+    target = args.output_dir if args.kind == 'danfe' else args.pdf_dir
+    if args.kind == 'danfe' and not target:
+        print("Informe --output-dir para trabalhos de DANFE.", file=sys.stderr)
+        return 1
+    queue = jobqueue.JobQueue(args.db)
+    added = queue.enqueue(args.kind, jobqueue.iter_job_sources(inputs), os.path.abspath(target) if target else '')
+    stats = queue.stats()
+    queue.close()
+    print(f"{added} trabalhos adicionados; {stats['na_fila']} na fila")
+    return 0
+
+
+def _print_queue_stats(stats):
+    print(f"na fila {stats['pending']}  em andamento {stats['running']}  concluídos {stats['done']}  "
+          f"com falha {stats['failed']}  {stats['trabalhos_por_segundo']:.1f} trabalhos/s", flush=True)
+
+
+def run_queue_work(args):
+    import jobqueue
+
+    queue = jobqueue.JobQueue(args.db)
+    if args.recover:
+        print(f"{queue.recover()} trabalhos interrompidos devolvidos à fila")
+    workers = args.workers or os.cpu_count() or 1
+    stop, processes = jobqueue.start_workers(workers, args.db, args.archive or None, args.batch, args.until_empty)
+    print(f"{workers} processos trabalhando na fila (Ctrl+C para parar ao fim do lote atual)")
+    try:
+        while any(process.is_alive() for process in processes):
+            for process in processes:
+                process.join(args.report_every / len(processes))
+            _print_queue_stats(queue.stats())
+    except KeyboardInterrupt:
+        print("Encerrando: os lotes em andamento são concluídos antes de sair")
+        stop.set()
+        for process in processes:
+            process.join()
+    _print_queue_stats(queue.stats())
+    failed = queue.errors()
+    queue.close()
+    for source, member, attempts, error in failed:
+        print(f"Falhou em {source}{':' + member if member else ''} ({attempts} tentativas): {error}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def run_queue_status(args):
+    import jobqueue
+
+    queue = jobqueue.JobQueue(args.db)
+    if args.retry_failed:
+        print(f"{queue.retry_failed()} trabalhos com falha devolvidos à fila")
+    if args.clear_done:
+        print(f"{queue.clear_done()} trabalhos concluídos removidos")
+    stats = queue.stats()
+    queue.close()
+    if args.json:
+        print(json.dumps(stats, indent=2))
+    else:
+        _print_queue_stats(stats)
+        if stats['espera_mais_antiga_s'] is not None:
+            print(f"Trabalho mais antigo na fila há {stats['espera_mais_antiga_s']:.0f}s")
+    return 0
+
+
+def run_notes(args):
+    store = shards.ShardedNoteStore(args.shards)
+    opened = store.shards_between(args.start, args.end)
+    start = time.perf_counter()
+    if args.search:
+        rows = [row[:5] for row in store.search(args.search, args.start, args.end, args.limit)]
+    else:
+        rows = store.notes_between(args.start, args.end, args.cnpj)
+    elapsed = time.perf_counter() - start
+    store.close()
+
+    writer = csv.writer(sys.stdout, delimiter=';')
+    writer.writerow(['chave', 'numero', 'serie', 'emissao', 'valor_total'])
+    writer.writerows(rows[:args.limit])
+    print(f"{len(rows)} notas em {elapsed * 1000:.1f} ms ({len(opened)} de {len(store.shard_keys())} meses abertos)",
+          file=sys.stderr)
+    return 0
+
+
+def run_shards(args):
+    store = shards.ShardedNoteStore(args.shards)
+    if args.split:
+        # Divide um banco único em meses: lê nota a nota e grava em lotes
+        source = storage.NoteStore(args.split)
+        chaves = [row[0] for row in source.conn.execute("SELECT chave FROM notes ORDER BY emissao")]
+        start = time.perf_counter()
+        for index in range(0, len(chaves), importer.STORE_BATCH_SIZE):
+            store.save_notes([source.load_note(chave) for chave in chaves[index:index + importer.STORE_BATCH_SIZE]])
+        source.close()
+        print(f"{len(chaves)} notas de {args.split} divididas por mês em {time.perf_counter() - start:.2f}s")
+
+    total_notes = total_bytes = 0
+    for key, count, size in store.stats():
+        print(f"{key:>9}  {count:8d} notas  {size / 1e6:8.1f} MB")
+        total_notes += count
+        total_bytes += size
+    print(f"{total_notes} notas em {len(store.shard_keys())} arquivos ({total_bytes / 1e6:.1f} MB)")
+    store.close()
+    return 0
+
+
+def run_summary(args):
+    # Totais lidos das tabelas de resumo mantidas na importação, sem ler os itens
+    store = open_store(args)
+    if args.rebuild:
+        start = time.perf_counter()
+        store.rebuild_summaries()
+        print(f"Resumos recalculados em {time.perf_counter() - start:.2f}s", file=sys.stderr)
+    start = time.perf_counter()
+    rows = store.summary(args.by, args.period, args.start, args.end, args.group)
+    elapsed = time.perf_counter() - start
+    store.close()
+
+    header = ['periodo', args.by, 'notas', 'itens'] + [report.VALUE_LABELS[name] for name in report.VALUE_COLUMNS]
+    lines = [list(row[:4]) + [format_cents(value) for value in row[4:]] for row in rows]
+    if args.csv:
+        with open(args.csv, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(header)
+            writer.writerows(lines)
+        print(f"{len(rows)} linhas gravadas em {args.csv}")
+    else:
+        print(';'.join(header))
+        for line in lines[:args.limit]:
+            print(';'.join(str(value) for value in line))
+    print(f"{len(rows)} linhas de resumo em {elapsed * 1000:.1f} ms", file=sys.stderr)
+    return 0
+
+
+def run_fetch(args):
+    import sefaz
+    concurrency = args.concurrency or sefaz.CONCURRENCY
+    rate = args.rate or sefaz.RATE_PER_HOST
+    try:
+        sefaz.check_template(args.url)
+    except sefaz.SefazError as e:
+        print(e, file=sys.stderr)
+        return 1
+    if args.keys == '-':
+        keys = sefaz.parse_keys(sys.stdin.read())
+    else:
+        with open(args.keys) as file:
+            keys = sefaz.parse_keys(file.read())
+    if not keys:
+        print("Nenhum CNPJ ou chave de acesso informado.", file=sys.stderr)
+        return 1
+
+    def progress(done, total, key, error):
+        if error:
+            print(f"Erro em {key}: {error}", file=sys.stderr)
+        if done % 100 == 0 or done == total:
+            print(f"{done}/{total} consultas concluídas")
+
+    client = None
+    if args.no_cache:
+        client = sefaz.SefazClient(pool_size=max(concurrency, sefaz.POOL_SIZE))
+
+    store = storage.NoteStore(args.db)
+    start = time.perf_counter()
+    results = sefaz.bulk_fetch(
+        keys, store, client=client,
+        url_template=args.url, concurrency=concurrency, rate=rate, on_result=progress,
+    )
+    store.close()
+
+    elapsed = time.perf_counter() - start
+    errors = sum(1 for key, data, error in results if error)
+    print(f"{len(results) - errors} de {len(results)} documentos obtidos em {elapsed:.2f}s ({len(results) / elapsed:.1f}/s)")
+    return 1 if errors else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='main.py', description="Importador de XML (modo sem interface)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    import_cmd = commands.add_parser('import', help="Importa em lote arquivos XML de NF-e")
+    import_cmd.add_argument('targets', nargs='+', help="Diretórios ou padrões glob com os arquivos XML")
+    import_cmd.add_argument('--workers', type=int, default=None, help="Número de processos (padrão: número de CPUs)")
+    import_cmd.add_argument('--pdf-dir', help="Gera o DANFE de cada nota neste diretório")
+    import_cmd.add_argument('--db', default=storage.DATABASE_PATH, help="Banco onde as notas são gravadas (vazio para não gravar)")
+    import_cmd.add_argument('--shards', metavar='PASTA', help="Grava as notas em um banco por mês de emissão nesta pasta (ex.: database/notas)")
+    import_cmd.add_argument('--archive', default=archive.ARCHIVE_PATH,
+                            help="Arquivo de XMLs (deduplicado e comprimido); vazio para não arquivar")
+    import_cmd.set_defaults(func=run_import)
+
+    pretty_cmd = commands.add_parser('pretty', help="Formata (indenta) arquivos XML em lote")
+    pretty_cmd.add_argument('targets', nargs='+', help="Diretórios ou padrões glob com os arquivos XML")
+    pretty_cmd.add_argument('--workers', type=int, default=None, help="Número de processos (padrão: número de CPUs)")
+    # Substituir os originais é opção explícita: a indentação acrescenta nós de texto dentro de infNFe,
+    # que a forma canônica (C14N) preserva, e o DigestValue da assinatura deixa de conferir
+    pretty_output = pretty_cmd.add_mutually_exclusive_group(required=True)
+    pretty_output.add_argument('--output-dir', help="Grava os arquivos formatados neste diretório")
+    pretty_output.add_argument('--in-place', action='store_true',
+                               help="Substitui os originais (a assinatura digital deixa de ser verificável)")
+    pretty_cmd.set_defaults(func=run_pretty)
+
+    danfe_cmd = commands.add_parser('danfe', help="Gera DANFEs em lote")
+    danfe_cmd.add_argument('targets', nargs='+', help="Diretórios ou padrões glob com os arquivos XML")
+    danfe_cmd.add_argument('--workers', type=int, default=None, help="Número de processos (padrão: número de CPUs)")
+    output = danfe_cmd.add_mutually_exclusive_group(required=True)
+    output.add_argument('--output-dir', help="Um PDF por nota, nomeado pela chave de acesso")
+    output.add_argument('--merge', metavar='ARQUIVO', help="Um único PDF com todas as notas")
+    danfe_cmd.add_argument('--timings', metavar='CSV', help="Grava o tempo de renderização de cada nota")
+    danfe_cmd.set_defaults(func=run_danfe)
+
+    report_cmd = commands.add_parser('report', help="Totais de vProd e impostos por NCM, CFOP, CNPJ e/ou mês")
+    report_cmd.add_argument('targets', nargs='+', help="Diretórios ou padrões glob com os arquivos XML")
+    report_cmd.add_argument('--by', nargs='+', choices=report.DIMENSIONS, default=['ncm'], help="Dimensões de agrupamento")
+    report_cmd.add_argument('--workers', type=int, default=None, help="Número de processos (padrão: número de CPUs)")
+    report_cmd.add_argument('--csv', help="Grava o relatório completo em CSV")
+    report_cmd.add_argument('--limit', type=int, default=50, help="Linhas exibidas na tela")
+    report_cmd.set_defaults(func=run_report)
+
+    watch_cmd = commands.add_parser('watch', help="Monitora uma pasta e importa os XML que chegarem")
+    watch_cmd.add_argument('directory', help="Pasta monitorada (inclui subpastas)")
+    watch_cmd.add_argument('--pdf-dir', help="Gera o DANFE de cada nota neste diretório")
+    watch_cmd.add_argument('--db', default=storage.DATABASE_PATH, help="Banco onde as notas são gravadas (vazio para não gravar)")
+    watch_cmd.add_argument('--shards', metavar='PASTA', help="Grava as notas em um banco por mês de emissão nesta pasta (ex.: database/notas)")
+    watch_cmd.add_argument('--archive', default=archive.ARCHIVE_PATH, help="Arquivo de XMLs; vazio para não arquivar")
+    watch_cmd.add_argument('--state', help="Registro dos arquivos já processados (padrão: database/watch.db)")
+    watch_cmd.add_argument('--settle', type=float, help="Segundos sem alteração antes de ler um arquivo (padrão: 2)")
+    watch_cmd.add_argument('--interval', type=float, default=None, help="Intervalo entre varreduras da pasta (s)")
+    watch_cmd.add_argument('--workers', type=int, default=None, help="Número de processos (padrão: número de CPUs)")
+    watch_cmd.add_argument('--metrics', help="Grava as métricas (vazão, fila, erros) neste arquivo JSON")
+    watch_cmd.add_argument('--report-every', type=float, default=10.0, help="Intervalo entre linhas de status (s)")
+    watch_cmd.set_defaults(func=run_watch)
+
+    archive_cmd = commands.add_parser('archive', help="Mostra o tamanho do arquivo de XMLs")
+    archive_cmd.add_argument('--archive', default=archive.ARCHIVE_PATH, help="Arquivo de XMLs")
+    archive_cmd.set_defaults(func=run_archive)
+
+    serve_cmd = commands.add_parser('serve', help="API HTTP local: parse, importação e DANFE para outros sistemas")
+    serve_cmd.add_argument('--host', default='127.0.0.1', help="Endereço de escuta (padrão: só esta máquina)")
+    serve_cmd.add_argument('--port', type=int, default=8080, help="Porta de escuta")
+    serve_cmd.add_argument('--workers', type=int, default=None, help="Número de processos (padrão: número de CPUs)")
+    serve_cmd.add_argument('--db', default=storage.DATABASE_PATH, help="Banco usado por /nfe/import (vazio para desativar)")
+    serve_cmd.add_argument('--shards', metavar='PASTA', help="Grava as notas em um banco por mês de emissão nesta pasta (ex.: database/notas)")
+    serve_cmd.add_argument('--archive', default=archive.ARCHIVE_PATH, help="Arquivo de XMLs; vazio para não arquivar")
+    serve_cmd.set_defaults(func=run_serve)
+
+    queue_cmd = commands.add_parser('queue', help="Fila persistente de importações e DANFEs (retomada após falhas)")
+    queue_actions = queue_cmd.add_subparsers(dest='action', required=True)
+
+    add_cmd = queue_actions.add_parser('add', help="Enfileira um trabalho por XML (ou por membro de ZIP)")
+    add_cmd.add_argument('kind', choices=('import', 'danfe'), help="Importar para o banco ou só gerar os DANFEs")
+    add_cmd.add_argument('targets', nargs='+', help="Diretórios ou padrões glob com os arquivos XML/pacotes")
+    add_cmd.add_argument('--pdf-dir', help="Na importação, gera também o DANFE de cada nota neste diretório")
+    add_cmd.add_argument('--output-dir', help="Diretório dos DANFEs (trabalhos 'danfe')")
+    add_cmd.add_argument('--db', default=storage.DATABASE_PATH, help="Banco com a fila e as notas")
+    add_cmd.set_defaults(func=run_queue_add)
+
+    work_cmd = queue_actions.add_parser('work', help="Processa a fila com vários processos")
+    work_cmd.add_argument('--workers', type=int, default=None, help="Número de processos (padrão: número de CPUs)")
+    work_cmd.add_argument('--batch', type=int, default=16, help="Trabalhos tomados por vez por processo")
+    work_cmd.add_argument('--until-empty', action='store_true', help="Sai quando a fila esvaziar")
+    work_cmd.add_argument('--recover', action='store_true',
+                          help="Devolve à fila já os trabalhos interrompidos (sem outro 'work' em execução)")
+    work_cmd.add_argument('--db', default=storage.DATABASE_PATH, help="Banco com a fila e as notas")
+    work_cmd.add_argument('--archive', default=archive.ARCHIVE_PATH, help="Arquivo de XMLs; vazio para não arquivar")
+    work_cmd.add_argument('--report-every', type=float, default=10.0, help="Intervalo entre linhas de status (s)")
+    work_cmd.set_defaults(func=run_queue_work)
+
+    status_cmd = queue_actions.add_parser('status', help="Tamanho da fila, vazão e falhas")
+    status_cmd.add_argument('--db', default=storage.DATABASE_PATH, help="Banco com a fila")
+    status_cmd.add_argument('--json', action='store_true', help="Saída em JSON")
+    status_cmd.add_argument('--retry-failed', action='store_true', help="Devolve à fila os trabalhos com falha")
+    status_cmd.add_argument('--clear-done', action='store_true', help="Remove os trabalhos concluídos")
+    status_cmd.set_defaults(func=run_queue_status)
+
+    notes_cmd = commands.add_parser('notes', help="Lista notas de um período nos bancos mensais (--shards)")
+    notes_cmd.add_argument('--from', dest='start', metavar='AAAA-MM-DD', help="Emitidas a partir desta data")
+    notes_cmd.add_argument('--to', dest='end', metavar='AAAA-MM-DD', help="Emitidas até esta data (inclusive)")
+    notes_cmd.add_argument('--cnpj', help="Emitente ou destinatário")
+    notes_cmd.add_argument('--search', help="Texto nos produtos, nomes e endereços")
+    notes_cmd.add_argument('--limit', type=int, default=200, help="Linhas exibidas")
+    notes_cmd.add_argument('--shards', default=shards.SHARDS_DIR, metavar='PASTA', help="Pasta dos bancos mensais")
+    notes_cmd.set_defaults(func=run_notes)
+
+    shards_cmd = commands.add_parser('shards', help="Tamanho dos bancos mensais; --split divide um banco único")
+    shards_cmd.add_argument('--shards', default=shards.SHARDS_DIR, metavar='PASTA', help="Pasta dos bancos mensais")
+    shards_cmd.add_argument('--split', metavar='BANCO', help="Copia as notas deste banco para os bancos mensais")
+    shards_cmd.set_defaults(func=run_shards)
+
+    summary_cmd = commands.add_parser('summary', help="Totais por emitente, destinatário, NCM, CFOP ou dia das notas importadas")
+    summary_cmd.add_argument('--by', choices=storage.SUMMARY_DIMENSIONS, default='emitente',
+                             help="Agrupamento ('dia': total de todas as notas)")
+    summary_cmd.add_argument('--period', choices=tuple(storage.SUMMARY_PERIODS), default='mes', help="Por mês ou por dia")
+    summary_cmd.add_argument('--from', dest='start', metavar='AAAA-MM-DD', help="A partir deste dia ou mês")
+    summary_cmd.add_argument('--to', dest='end', metavar='AAAA-MM-DD', help="Até este dia ou mês (inclusive)")
+    summary_cmd.add_argument('--group', help="Só este CNPJ, NCM ou CFOP")
+    summary_cmd.add_argument('--rebuild', action='store_true', help="Recalcula os resumos a partir dos itens gravados")
+    summary_cmd.add_argument('--csv', help="Grava o resumo completo em CSV")
+    summary_cmd.add_argument('--limit', type=int, default=50, help="Linhas exibidas na tela")
+    summary_cmd.add_argument('--db', default=storage.DATABASE_PATH, help="Banco das notas importadas")
+    summary_cmd.add_argument('--shards', metavar='PASTA', help="Lê os bancos mensais desta pasta em vez do --db")
+    summary_cmd.set_defaults(func=run_summary)
+
+    fetch_cmd = commands.add_parser('fetch', help="Busca em lote na SEFAZ uma lista de CNPJs/chaves de acesso")
+    fetch_cmd.add_argument('keys', help="Arquivo com os CNPJs/chaves (ou - para ler da entrada padrão)")
+    fetch_cmd.add_argument('--concurrency', type=int, help="Consultas simultâneas (padrão: 8)")
+    fetch_cmd.add_argument('--rate', type=float, help="Requisições por segundo por host (padrão: 5)")
+    fetch_cmd.add_argument('--url', required=True, help="URL de consulta; {chave} é substituído por cada CNPJ/chave")
+    fetch_cmd.add_argument('--db', default=storage.DATABASE_PATH, help="Banco onde as notas são gravadas")
+    fetch_cmd.add_argument('--no-cache', action='store_true', help="Ignora o cache local e consulta sempre a SEFAZ")
+    fetch_cmd.set_defaults(func=run_fetch)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from reportlab import rl_config
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+from reportlab.lib.units import mm
+
+import nfe
+from model import format_cents
+
+# Streams binários (sem ASCII85): o logo deixa de ser codificado em Python a cada PDF
+rl_config.useA85 = 0
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logo.png')
+
+FRAME_FORM = 'danfe_frame'
+
+# Área da tabela de produtos
+ITEMS_TOP = 188 * mm
+ITEMS_BOTTOM = 22 * mm
+ROW_HEIGHT = 5 * mm
+ROWS_PER_PAGE = int((ITEMS_TOP - ITEMS_BOTTOM) // ROW_HEIGHT) + 1
+
+DESCRICAO_WIDTH = 110 * mm
+
+
+@lru_cache(maxsize=None)
+def _logo():
+    # Decodificar o PNG custa mais que o resto da página: uma vez por processo
+    return ImageReader(LOGO_PATH) if os.path.exists(LOGO_PATH) else None
+
+
+def _text(value):
+    return str(value) if value is not None else ''
+
+
+def _fit(text, width, font, size):
+    # Corta descrições que invadiriam a coluna seguinte
+    if stringWidth(text, font, size) <= width:
+        return text
+    while text and stringWidth(text + '...', font, size) > width:
+        text = text[:-1]
+    return text + '...'
+
+
+class DanfeWriter:
+    # Um PDF com uma ou mais notas; a moldura fixa da página é desenhada uma única vez
+    # como form XObject e reaproveitada em todas as páginas de todas as notas
+    def __init__(self, output_file):
+        self.canvas = canvas.Canvas(output_file, pagesize=A4)
+        self.width, self.height = A4
+        self.documents = 0
+        self.pages = 0
+        self._draw_frame()
+
+    def _draw_frame(self):
+        c = self.canvas
+        c.beginForm(FRAME_FORM)
+
+        c.setLineWidth(0.5)
+        c.rect(10 * mm, 10 * mm, 190 * mm, 277 * mm)
+        for y in (262, 232, 202, 192):
+            c.line(10 * mm, y * mm, 200 * mm, y * mm)
+        c.line(105 * mm, 262 * mm, 105 * mm, 287 * mm)
+
+        # Cabeçalho
+        logo = _logo()
+        if logo is not None:
+            c.drawImage(logo, 12 * mm, 264 * mm, width=20 * mm, height=21 * mm,
+                        preserveAspectRatio=True, mask='auto')
+        c.setFont("Helvetica-Bold", 16)
+        c.drawString(35 * mm, 277 * mm, "DANFE")
+        c.setFont("Helvetica", 7)
+        c.drawString(35 * mm, 271 * mm, "Documento Auxiliar da")
+        c.drawString(35 * mm, 267 * mm, "Nota Fiscal Eletrônica")
+        c.drawString(107 * mm, 274 * mm, "CHAVE DE ACESSO")
+
+        # Rótulos das seções
+        c.setFont("Helvetica-Bold", 8)
+        c.drawString(12 * mm, 257 * mm, "EMITENTE")
+        c.drawString(12 * mm, 227 * mm, "DESTINATÁRIO")
+        c.drawString(12 * mm, 197 * mm, "PRODUTOS")
+
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(12 * mm, 194 * mm, "Descrição")
+        c.drawRightString(150 * mm, 194 * mm, "Quantidade")
+        c.drawRightString(198 * mm, 194 * mm, "Valor")
+
+        c.endForm()
+
+    def _draw_header(self, data, form_name):
+        # Dados da nota repetidos em todas as suas páginas: também viram um form
+        c = self.canvas
+        c.beginForm(form_name)
+
+        c.setFont("Helvetica-Bold", 10)
+        c.drawString(107 * mm, 280 * mm, f"Nº {_text(data.numero)}   Série {_text(data.serie)}")
+        chave = _text(data.chave)
+        c.setFont("Helvetica", 8)
+        c.drawString(107 * mm, 269 * mm, ' '.join(chave[i:i + 4] for i in range(0, len(chave), 4)))
+        c.drawString(107 * mm, 264 * mm, f"Emissão: {_text(data.emissao)}")
+
+        c.setFont("Helvetica", 10)
+        for top, party, label in ((252, data.emitente, "Emitente"), (222, data.destinatario, "Destinatário")):
+            c.drawString(12 * mm, top * mm, f"{label}: {_text(party.nome)}")
+            c.drawString(12 * mm, (top - 5) * mm, f"CNPJ: {_text(party.cnpj)}")
+            c.drawString(12 * mm, (top - 10) * mm, f"Endereço: {_text(party.endereco)}, Bairro: {_text(party.bairro)}")
+            c.drawString(12 * mm, (top - 15) * mm, f"Cidade: {_text(party.cidade)}, UF: {_text(party.uf)}")
+
+        c.endForm()
+
+    def add(self, data):
+        c = self.canvas
+        self.documents += 1
+        header_form = f'danfe_header_{self.documents}'
+        self._draw_header(data, header_form)
+
+        produtos = data.produtos
+        page_count = max(1, math.ceil(len(produtos) / ROWS_PER_PAGE))
+        for page in range(page_count):
+            c.doForm(FRAME_FORM)
+            c.doForm(header_form)
+
+            c.setFont("Helvetica", 9)
+            y = ITEMS_TOP
+            for produto in produtos[page * ROWS_PER_PAGE:(page + 1) * ROWS_PER_PAGE]:
+                c.drawString(12 * mm, y, _fit(_text(produto.descricao), DESCRICAO_WIDTH, "Helvetica", 9))
+                c.drawRightString(150 * mm, y, _text(produto.quantidade))
+                c.drawRightString(198 * mm, y, _text(format_cents(produto.valor)))
+                y -= ROW_HEIGHT
+
+            c.setFont("Helvetica", 8)
+            c.drawRightString(198 * mm, 13 * mm, f"Folha {page + 1}/{page_count}")
+            c.showPage()
+            self.pages += 1
+        return page_count
+
+    def save(self):
+        self.canvas.save()
+
+
+def generate_danfe(data, output_file):
+    writer = DanfeWriter(output_file)
+    writer.add(data)
+    writer.save()
+
+
+def danfe_file_name(data, position):
+    return f"{data.chave or f'nota-{position:06d}'}.pdf"
+
+
+def render_one(data, output_file):
+    # Retorna (chave, páginas, segundos) para medir o custo de renderização por página
+    start = time.perf_counter()
+    writer = DanfeWriter(output_file)
+    pages = writer.add(data)
+    writer.save()
+    return data.chave, pages, time.perf_counter() - start
+
+
+def render_batch(notes, output_dir, workers=None):
+    # Um PDF por nota, renderizados em paralelo (o canvas do ReportLab é limitado pela GIL)
+    notes = list(notes)
+    outputs = [os.path.join(output_dir, danfe_file_name(data, n)) for n, data in enumerate(notes, start=1)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(notes) // ((workers or os.cpu_count() or 1) * 8))
+        return list(pool.map(render_one, notes, outputs, chunksize=chunksize))
+
+
+def render_merged(notes, output_file):
+    # Um único PDF com todas as notas; roda num só processo porque os forms são
+    # por documento PDF e juntar PDFs gerados em paralelo exigiria outra biblioteca
+    timings = []
+    writer = DanfeWriter(output_file)
+    for data in notes:
+        start = time.perf_counter()
+        pages = writer.add(data)
+        timings.append((data.chave, pages, time.perf_counter() - start))
+    start = time.perf_counter()
+    writer.save()
+    return timings, time.perf_counter() - start
+
+
+def create_pdf(file_path, xml_content):
+    data = nfe.parse_nfe(xml_content)
+    generate_danfe(data, file_path)
@@ -0,0 +1,72 @@
+import sqlite3
+import threading
+import weakref
+
+# Perfil usado por todos os bancos do programa:
+# - WAL: leitores não bloqueiam o gravador (pesquisa na interface durante uma importação)
+# - synchronous=NORMAL: com WAL, o fsync fica só nos checkpoints; uma queda de energia pode
+#   perder as últimas transações, mas nunca corrompe o banco
+# - cache de 64 MB e leitura por mmap de até 256 MB
+PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64 * 1024,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Espera por um banco ocupado por outro processo ou conexão (s)
+BUSY_TIMEOUT = 30.0
+
+# Comandos preparados mantidos por conexão: todo SQL do programa é constante, com parâmetros
+STATEMENT_CACHE = 256
+
+
+def connect(path, check_same_thread=True, pragmas=None):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=check_same_thread,
+                           cached_statements=STATEMENT_CACHE)
+    for name, value in (PRAGMAS if pragmas is None else pragmas).items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+class _ThreadConnection:
+    # Conexão de uma thread, guardada no threading.local: quando a thread termina o objeto é
+    # liberado e a conexão fechada (o servidor HTTP cria uma thread por conexão de cliente)
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __del__(self):
+        self.conn.close()
+
+
+class ConnectionManager:
+    # Uma conexão por thread para o mesmo arquivo: threads de trabalho e a do Tk (ou do servidor
+    # HTTP) usam o mesmo objeto sem compartilhar conexão nem precisar de lock
+    def __init__(self, path, pragmas=None):
+        self.path = path
+        self.pragmas = pragmas
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        # Só referências fracas: a lista não mantém viva a conexão de uma thread que já terminou
+        self.connections = weakref.WeakSet()
+
+    def get(self):
+        holder = getattr(self.local, 'holder', None)
+        if holder is None:
+            # check_same_thread desligado só para que close() possa fechar todas de uma thread
+            holder = self.local.holder = _ThreadConnection(
+                connect(self.path, check_same_thread=False, pragmas=self.pragmas)
+            )
+            with self.lock:
+                self.connections.add(holder)
+        return holder.conn
+
+    def close(self):
+        with self.lock:
+            holders, self.connections = list(self.connections), weakref.WeakSet()
+        for holder in holders:
+            holder.conn.close()
+        self.local = threading.local()
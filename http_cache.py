@@ -0,0 +1,120 @@
+import threading
+import time
+import zlib
+
+import db
+
+CACHE_PATH = 'database/http_cache.db'
+MAX_SIZE = 512 * 1024 * 1024
+
+# XML autorizado não muda: por padrão uma entrada nunca precisa ser revalidada
+MAX_AGE = None
+
+
+class CacheEntry:
+    __slots__ = ('body', 'etag', 'last_modified', 'stored_at')
+
+    def __init__(self, body, etag, last_modified, stored_at):
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+
+    def is_fresh(self, max_age):
+        return max_age is None or time.time() - self.stored_at < max_age
+
+    def conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class ResponseCache:
+    # Respostas comprimidas em SQLite, com descarte LRU quando passam de max_size bytes.
+    # Usado por várias threads da busca em lote: todo acesso passa pelo lock
+    def __init__(self, path=CACHE_PATH, max_size=MAX_SIZE, max_age=MAX_AGE):
+        self.max_size = max_size
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.conn = db.connect(path, check_same_thread=False)
+        self.create_table()
+        self.total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def create_table(self):
+        cursor = self.conn.cursor()
+        cursor.executescript('''
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+
+            CREATE INDEX IF NOT EXISTS idx_responses_accessed_at ON responses (accessed_at);
+        ''')
+        self.conn.commit()
+
+    def get(self, url):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, stored_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        body, etag, last_modified, stored_at = row
+        return CacheEntry(zlib.decompress(body).decode('utf-8'), etag, last_modified, stored_at)
+
+    def put(self, url, body, etag=None, last_modified=None):
+        blob = zlib.compress(body.encode('utf-8'))
+        now = time.time()
+        with self.lock, self.conn:
+            old = self.conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, blob, etag, last_modified, len(blob), now, now),
+            )
+            self.total_size += len(blob) - (old[0] if old else 0)
+            if self.total_size > self.max_size:
+                self._evict()
+
+    def revalidated(self, url):
+        # Resposta 304: o conteúdo guardado continua valendo
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE responses SET stored_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+
+    def discard(self, url):
+        with self.lock, self.conn:
+            old = self.conn.execute("SELECT size FROM responses WHERE url = ?", (url,)).fetchone()
+            if old:
+                self.conn.execute("DELETE FROM responses WHERE url = ?", (url,))
+                self.total_size -= old[0]
+
+    def _evict(self):
+        # Remove as entradas menos usadas recentemente até caber no limite
+        excess = self.total_size - self.max_size
+        removed = []
+        freed = 0
+        for url, size in self.conn.execute("SELECT url, size FROM responses ORDER BY accessed_at"):
+            if freed >= excess:
+                break
+            removed.append((url,))
+            freed += size
+        self.conn.executemany("DELETE FROM responses WHERE url = ?", removed)
+        self.total_size -= freed
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM responses")
+            self.total_size = 0
+
+    def close(self):
+        self.conn.close()
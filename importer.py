@@ -0,0 +1,164 @@
+import os
+import signal
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import archive
+import nfe
+import sources
+
+# Pipeline de importação compartilhado pela linha de comando, pela interface, pelo serviço
+# HTTP (api), pela pasta monitorada (watcher) e pela fila (jobqueue). O danfe (ReportLab) só é
+# carregado pelos processos do pool que geram PDF
+
+# Notas gravadas por transação no modo em lote
+STORE_BATCH_SIZE = 500
+
+# Documentos enviados juntos a cada processo do pool na importação
+IMPORT_CHUNK = 16
+
+_reader = None
+
+
+def _archive_reader(path):
+    # Conexão ao arquivo de XMLs aberta uma vez em cada processo do pool
+    global _reader
+    if _reader is None or _reader.path != path:
+        _reader = archive.XMLArchive(path)
+    return _reader
+
+
+def import_file(source, pdf_dir=None, archive_path=None):
+    # Executado nos processos do pool: nenhuma janela do customtkinter é criada aqui.
+    # 'source' é um caminho ou um membro de pacote (sources.ZipMember/TarMember), lido em fluxo.
+    # Com archive_path, bytes já arquivados são reconhecidos antes do parse (data None e um
+    # archive.Archived no lugar do Prepared) e os novos voltam já com hash e compressão prontos
+    name = str(source)
+    size = sources.source_size(source)
+    prepared = None
+    try:
+        with sources.open_source(source) as file:
+            if archive_path:
+                raw = file.read()
+            else:
+                data = nfe.parse_nfe(file)
+        if archive_path:
+            reader = _archive_reader(archive_path)
+            known = reader.archived(archive.raw_digest(raw))
+            if known is not None:
+                return name, size, None, known, None
+            data = nfe.parse_nfe(raw)
+            prepared = archive.Prepared(raw, canonical=bool(data.chave) and reader.has_chave(data.chave))
+        if pdf_dir:
+            base_name = source.name if not isinstance(source, str) else source
+            pdf_name = os.path.splitext(os.path.basename(base_name))[0] + '.pdf'
+            import danfe
+            danfe.generate_danfe(data, os.path.join(pdf_dir, pdf_name))
+    except Exception as e:
+        return name, size, None, None, f"{type(e).__name__}: {e}"
+    return name, size, data, prepared, None
+
+
+def import_chunk(chunk, pdf_dir=None, archive_path=None):
+    return [import_file(source, pdf_dir, archive_path) for source in chunk]
+
+
+def ignore_interrupt():
+    # Inicializador de pools de serviços longos (watch, serve): Ctrl+C é tratado só pelo
+    # processo principal, que encerra o pool de forma ordenada
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def imap_bounded(pool, func, items, max_pending, *args):
+    # Como pool.map, mas consome 'items' aos poucos: no máximo max_pending tarefas em andamento,
+    # de modo que a memória não depende do tamanho da entrada (pacotes com milhares de XMLs)
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(func, item, *args))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _chunks(items, size):
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+class ImportBatch:
+    # Notas a gravar e os XMLs correspondentes, gravados juntos em flush(): o arquivo de XMLs só
+    # registra um documento depois que a nota está no banco, então um cancelamento ou erro no meio
+    # do lote não deixa nota arquivada e nunca gravada. Duplicado é o documento já arquivado cuja
+    # chave também já está no banco de destino (outro banco, ou um banco apagado, recebe a nota)
+    def __init__(self, store=None, xml_archive=None, size=STORE_BATCH_SIZE):
+        self.store = store
+        self.xml_archive = xml_archive
+        self.size = size
+        self.notes = []
+        self.documents = []
+        self.chaves = set()
+
+    def _stored(self, chave):
+        return chave in self.chaves or self.store is None or self.store.has_note(chave)
+
+    def add(self, data, prepared=None):
+        # data/prepared como retornados por import_file; retorna a nota importada, ou None se duplicada
+        if isinstance(prepared, archive.Archived):
+            if self._stored(prepared.chave):
+                return None
+            # Bytes arquivados de uma nota que não está neste banco: o parse é feito a partir do arquivo
+            data = nfe.parse_nfe(self.xml_archive.get(prepared.sha256))
+            prepared = None
+        elif prepared is not None:
+            self.documents.append((prepared, data.chave))
+            if self._stored(data.chave) and self.xml_archive.is_archived(prepared, data.chave):
+                # Outra formatação de um documento arquivado: só os bytes são registrados no flush
+                return None
+        self.notes.append(data)
+        self.chaves.add(data.chave)
+        if len(self.notes) >= self.size:
+            self.flush()
+        return data
+
+    def flush(self):
+        if self.store is not None and self.notes:
+            self.store.save_notes(self.notes)
+        if self.xml_archive is not None and self.documents:
+            self.xml_archive.put_many(self.documents)
+        self.notes = []
+        self.documents = []
+        self.chaves = set()
+
+
+def import_sources(items, store=None, xml_archive=None, pdf_dir=None, workers=None, on_result=None):
+    # Importa XMLs soltos e membros de pacotes em paralelo; as notas são gravadas em lotes.
+    # on_result(totais, nome, erro) é chamado a cada documento, no processo principal
+    workers = workers or os.cpu_count() or 1
+    archive_path = xml_archive.path if xml_archive else None
+    totals = dict.fromkeys(('arquivos', 'importados', 'duplicados', 'erros', 'itens', 'bytes'), 0)
+    batch = ImportBatch(store, xml_archive)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = imap_bounded(pool, import_chunk, _chunks(items, IMPORT_CHUNK), workers * 2, pdf_dir, archive_path)
+        for chunk in results:
+            for name, size, data, prepared, error in chunk:
+                totals['arquivos'] += 1
+                totals['bytes'] += size
+                if error:
+                    totals['erros'] += 1
+                else:
+                    data = batch.add(data, prepared)
+                    if data is None:
+                        # Já importado (mesmos bytes, ou o mesmo documento com outra formatação)
+                        totals['duplicados'] += 1
+                    else:
+                        totals['importados'] += 1
+                        totals['itens'] += len(data.produtos)
+                if on_result:
+                    on_result(totals, name, error)
+
+    batch.flush()
+    return totals
@@ -0,0 +1,284 @@
+import multiprocessing
+import os
+import socket
+import time
+
+import archive
+import db
+import nfe
+import sources
+import storage
+from importer import ignore_interrupt
+
+# Fila no mesmo banco das notas: os trabalhos sobrevivem ao fechamento do programa
+QUEUE_PATH = storage.DATABASE_PATH
+
+KINDS = ('import', 'danfe')
+STATUSES = ('pending', 'running', 'done', 'failed')
+
+# Trabalhos tomados de uma vez por cada processo
+CLAIM_BATCH = 16
+
+# Um trabalho 'running' sem conclusão depois deste prazo (processo que morreu) volta para a fila
+LEASE_SECONDS = 600.0
+
+# Tentativas antes de um trabalho ficar como 'failed'
+MAX_ATTEMPTS = 3
+
+# Espera entre consultas à fila vazia
+IDLE_INTERVAL = 1.0
+
+# Janela usada no cálculo da vazão
+THROUGHPUT_WINDOW = 60.0
+
+
+class Job:
+    __slots__ = ('id', 'kind', 'source', 'member', 'target', 'attempts')
+
+    def __init__(self, id, kind, source, member, target, attempts):
+        self.id = id
+        self.kind = kind
+        self.source = source
+        self.member = member
+        self.target = target
+        self.attempts = attempts
+
+    def __str__(self):
+        return f"{self.source}:{self.member}" if self.member else self.source
+
+
+class JobQueue:
+    # Trabalhos de importação/DANFE persistidos: pending -> running -> done | failed.
+    # Cada processo toma um lote com um único UPDATE ... RETURNING, então dois processos nunca
+    # pegam o mesmo trabalho; um 'running' abandonado volta à fila quando o prazo vence
+    def __init__(self, path=QUEUE_PATH, check_same_thread=True):
+        self.path = path
+        self.conn = db.connect(path, check_same_thread=check_same_thread)
+        self.create_tables()
+
+    def create_tables(self):
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY,
+                kind TEXT NOT NULL,
+                source TEXT NOT NULL,
+                member TEXT NOT NULL DEFAULT '',
+                target TEXT NOT NULL DEFAULT '',
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                lease_until REAL
+            );
+
+            -- Reenfileirar a mesma pasta não duplica trabalhos
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_unique ON jobs (kind, source, member, target);
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id);
+            CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished_at);
+        ''')
+        self.conn.commit()
+
+    def enqueue(self, kind, items, target=''):
+        # items: caminhos ou membros de pacote (sources); retorna quantos trabalhos eram novos
+        if kind not in KINDS:
+            raise ValueError(f"Tipo de trabalho desconhecido: {kind}")
+        now = time.time()
+        rows = []
+        for item in items:
+            if isinstance(item, str):
+                rows.append((kind, item, '', target or '', now))
+            else:
+                rows.append((kind, item.container, item.name, target or '', now))
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO jobs (kind, source, member, target, created_at) VALUES (?, ?, ?, ?, ?)", rows
+            )
+            return self.conn.total_changes - before
+
+    def claim(self, worker, limit=CLAIM_BATCH, lease=LEASE_SECONDS):
+        now = time.time()
+        with self.conn:
+            rows = self.conn.execute('''
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = ?,
+                                started_at = ?, lease_until = ?, error = NULL
+                WHERE id IN (
+                    SELECT id FROM jobs WHERE status = 'pending'
+                    UNION ALL
+                    SELECT id FROM jobs WHERE status = 'running' AND lease_until < ?
+                    ORDER BY id LIMIT ?
+                )
+                RETURNING id, kind, source, member, target, attempts
+            ''', (worker, now, now + lease, now, limit)).fetchall()
+        return sorted((Job(*row) for row in rows), key=lambda job: job.id)
+
+    def finish(self, results, max_attempts=MAX_ATTEMPTS):
+        # results: (job, erro ou None). Com erro, volta para a fila até esgotar as tentativas
+        now = time.time()
+        done = [(now, job.id) for job, error in results if error is None]
+        failed = [(error, now, job.id) for job, error in results if error is not None and job.attempts >= max_attempts]
+        retry = [(error, job.id) for job, error in results if error is not None and job.attempts < max_attempts]
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE jobs SET status = 'done', finished_at = ?, lease_until = NULL WHERE id = ?", done
+            )
+            self.conn.executemany(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = ?, lease_until = NULL WHERE id = ?",
+                failed,
+            )
+            self.conn.executemany(
+                "UPDATE jobs SET status = 'pending', error = ?, lease_until = NULL WHERE id = ?", retry
+            )
+
+    def recover(self):
+        # Devolve à fila todos os 'running' (sem esperar o prazo); só com nenhum processo ativo
+        with self.conn:
+            return self.conn.execute(
+                "UPDATE jobs SET status = 'pending', lease_until = NULL WHERE status = 'running'"
+            ).rowcount
+
+    def retry_failed(self):
+        with self.conn:
+            return self.conn.execute(
+                "UPDATE jobs SET status = 'pending', attempts = 0, finished_at = NULL WHERE status = 'failed'"
+            ).rowcount
+
+    def clear_done(self):
+        with self.conn:
+            return self.conn.execute("DELETE FROM jobs WHERE status = 'done'").rowcount
+
+    def stats(self, window=THROUGHPUT_WINDOW):
+        now = time.time()
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        recent, first, duration = self.conn.execute(
+            "SELECT COUNT(*), MIN(finished_at), AVG(finished_at - started_at) FROM jobs "
+            "WHERE status = 'done' AND finished_at >= ?",
+            (now - window,),
+        ).fetchone()
+        # Vazão sobre o trecho da janela em que houve conclusões (execuções mais curtas que a janela)
+        span = max(1.0, now - first) if first is not None else window
+        oldest = self.conn.execute("SELECT MIN(created_at) FROM jobs WHERE status = 'pending'").fetchone()[0]
+        return dict(
+            counts,
+            na_fila=counts['pending'],
+            trabalhos_por_segundo=recent / span,
+            duracao_media_s=duration,
+            espera_mais_antiga_s=now - oldest if oldest is not None else None,
+        )
+
+    def errors(self, limit=20):
+        return self.conn.execute(
+            "SELECT source, member, attempts, error FROM jobs WHERE status = 'failed' ORDER BY id LIMIT ?", (limit,)
+        ).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+def iter_job_sources(paths):
+    # Um trabalho por XML solto e por membro de ZIP; cada TAR é um trabalho inteiro
+    for path in paths:
+        if sources.is_bundle(path) and path.lower().endswith(sources.ZIP_SUFFIXES):
+            yield from sources.iter_zip(path)
+        else:
+            yield path
+
+
+def _documents(job):
+    # Bytes de cada XML do trabalho: um arquivo, um membro de ZIP ou todos os XML de um TAR
+    # (TAR comprimido não tem acesso direto: o pacote inteiro é um trabalho só)
+    if job.member:
+        with sources.ZipMember(job.source, job.member, 0).open() as file:
+            yield file.read()
+    elif sources.is_bundle(job.source):
+        for member in sources.iter_bundle(job.source):
+            with member.open() as file:
+                yield file.read()
+    else:
+        with open(job.source, 'rb') as file:
+            yield file.read()
+
+
+def run_job(job, xml_archive=None):
+    # Retorna (nota, Prepared ou None) de cada documento: quem chama grava as notas e só depois
+    # arquiva os XMLs. Refazer um trabalho é seguro: o arquivo de XMLs ignora conteúdo repetido
+    # e a gravação substitui a nota pela chave de acesso.
+    # target: pasta dos DANFEs (obrigatória em 'danfe', opcional em 'import')
+    if job.target:
+        import danfe
+        os.makedirs(job.target, exist_ok=True)
+    notes = []
+    for raw in _documents(job):
+        data = nfe.parse_nfe(raw)
+        if job.kind == 'import':
+            prepared = None
+            if xml_archive is not None:
+                prepared = archive.Prepared(raw, canonical=bool(data.chave) and xml_archive.has_chave(data.chave))
+            notes.append((data, prepared))
+        if job.target:
+            danfe.generate_danfe(data, os.path.join(job.target, danfe.danfe_file_name(data, job.id)))
+    return notes
+
+
+def work(path=QUEUE_PATH, archive_path=None, stop=None, batch=CLAIM_BATCH, until_empty=False):
+    # Laço de um processo de trabalho: toma um lote, executa, grava as notas e marca o resultado
+    queue = JobQueue(path)
+    store = storage.NoteStore(path)
+    xml_archive = archive.XMLArchive(archive_path) if archive_path else None
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    try:
+        while stop is None or not stop.is_set():
+            jobs = queue.claim(worker, batch)
+            if not jobs:
+                if until_empty:
+                    break
+                if stop is not None:
+                    stop.wait(IDLE_INTERVAL)
+                else:
+                    time.sleep(IDLE_INTERVAL)
+                continue
+            notes = []
+            documents = []
+            results = []
+            for job in jobs:
+                try:
+                    for data, prepared in run_job(job, xml_archive):
+                        notes.append(data)
+                        if prepared is not None:
+                            documents.append((prepared, data.chave))
+                    results.append((job, None))
+                except Exception as e:
+                    results.append((job, f"{type(e).__name__}: {e}"))
+            # Notas, depois XMLs, depois o status: se o processo morrer no meio, o trabalho só é refeito
+            if notes:
+                store.save_notes(notes)
+            if documents:
+                xml_archive.put_many(documents)
+            queue.finish(results)
+    finally:
+        queue.close()
+        store.close()
+        if xml_archive is not None:
+            xml_archive.close()
+
+
+def _work_process(path, archive_path, stop, batch, until_empty):
+    ignore_interrupt()
+    work(path, archive_path, stop, batch, until_empty)
+
+
+def start_workers(count, path=QUEUE_PATH, archive_path=None, batch=CLAIM_BATCH, until_empty=False):
+    # Processos independentes sobre a mesma fila; stop.set() encerra cada um ao fim do lote atual
+    stop = multiprocessing.Event()
+    processes = [
+        multiprocessing.Process(target=_work_process, args=(path, archive_path, stop, batch, until_empty),
+                                name=f'fila-{index + 1}')
+        for index in range(count)
+    ]
+    for process in processes:
+        process.start()
+    return stop, processes
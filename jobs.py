@@ -0,0 +1,117 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+POLL_INTERVAL_MS = 50
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, runner, on_done, on_error, on_cancel=None):
+        self.runner = runner
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.future = None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+        # Trabalho ainda na fila nunca vai rodar: avisa o runner diretamente
+        if self.future is not None and self.future.cancel():
+            self.runner.results.put(('cancelled', self, None))
+
+    def check_cancelled(self):
+        # Chamado pelo trabalho entre etapas para interromper o quanto antes
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+    def report(self, fraction):
+        self.runner.results.put(('progress', self, fraction))
+
+    def call(self, func, *args):
+        # Resultado parcial: func roda na thread do Tk, se o trabalho ainda não tiver terminado
+        self.runner.results.put(('call', self, (func, args)))
+
+
+# Executa trabalhos fora da thread do Tk e entrega os resultados via master.after
+class JobRunner:
+    def __init__(self, master, max_workers=1, on_progress=None, on_idle=None):
+        self.master = master
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.results = queue.Queue()
+        self.jobs = set()
+        self.on_progress = on_progress
+        self.on_idle = on_idle
+        self.poll_id = self.master.after(POLL_INTERVAL_MS, self._poll)
+
+    def submit(self, func, *args, on_done=None, on_error=None, on_cancel=None):
+        # func recebe o Job como primeiro argumento para informar progresso e checar cancelamento
+        job = Job(self, on_done, on_error, on_cancel)
+        self.jobs.add(job)
+        job.report(None)
+        job.future = self.executor.submit(self._run, job, func, args)
+        return job
+
+    def _run(self, job, func, args):
+        try:
+            job.check_cancelled()
+            result = func(job, *args)
+            job.check_cancelled()
+        except JobCancelled:
+            self.results.put(('cancelled', job, None))
+        except Exception as e:
+            self.results.put(('error', job, e))
+        else:
+            self.results.put(('done', job, result))
+
+    def cancel_all(self):
+        for job in list(self.jobs):
+            job.cancel()
+
+    def busy(self):
+        return bool(self.jobs)
+
+    def _poll(self):
+        # Roda na thread do Tk: único lugar onde os callbacks tocam na interface
+        try:
+            while True:
+                kind, job, value = self.results.get_nowait()
+                if kind == 'progress':
+                    if job in self.jobs and self.on_progress:
+                        self.on_progress(value)
+                    continue
+                if kind == 'call':
+                    if job in self.jobs:
+                        func, args = value
+                        func(*args)
+                    continue
+
+                if job not in self.jobs:
+                    continue
+                self.jobs.discard(job)
+                if kind == 'done' and job.on_done:
+                    job.on_done(value)
+                elif kind == 'error' and job.on_error:
+                    job.on_error(value)
+                elif kind == 'cancelled' and job.on_cancel:
+                    job.on_cancel()
+                if not self.jobs and self.on_idle:
+                    self.on_idle()
+        except queue.Empty:
+            pass
+        self.poll_id = self.master.after(POLL_INTERVAL_MS, self._poll)
+
+    def shutdown(self):
+        # Ao fechar a janela: cancela tudo e para de consultar a fila de resultados. O trabalho em
+        # andamento termina na próxima check_cancelled() e o processo sai em seguida
+        self.master.after_cancel(self.poll_id)
+        self.cancel_all()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -1,13 +1,53 @@
 import customtkinter as ctk
 from tkinter import filedialog, messagebox
+import importlib
+import os
+import shutil
 import sqlite3
-import requests
-import xml.etree.ElementTree as ET
-import xml.dom.minidom
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import mm
-from PIL import Image, ImageTk
+import sys
+import tempfile
+import threading
+
+import archive
+import db
+import importer
+import jobs
+import nfe
+import pretty
+import sources
+import storage
+import viewer
+
+# Pilhas pesadas (HTTP e PDF) não são importadas na abertura: cada uma é carregada no primeiro
+# uso ou em segundo plano, depois que a janela de login aparece
+DEFERRED_MODULES = ('sefaz', 'danfe')
+PRELOAD_DELAY_MS = 500
+
+
+def preload_modules():
+    # O lock de importação do Python faz um uso antecipado na thread do Tk esperar esta carga
+    def load():
+        for name in DEFERRED_MODULES:
+            try:
+                importlib.import_module(name)
+            except ImportError:
+                pass  # o erro aparece de novo, com a mensagem certa, quando a função for usada
+
+    threading.Thread(target=load, name='preload', daemon=True).start()
+
+
+class PreviewOutput:
+    # Repassa a saída do pretty.pretty_print ao arquivo e entrega o primeiro bloco escrito uma única vez
+    def __init__(self, out, on_first):
+        self.out = out
+        self.on_first = on_first
+
+    def write(self, data):
+        self.out.write(data)
+        if self.on_first is not None:
+            on_first, self.on_first = self.on_first, None
+            on_first(data)
+
 
 class XMLImporterApp:
     def __init__(self, master):
@@ -15,6 +55,20 @@ class XMLImporterApp:
         master.title("Importador de XML")
         self.master.geometry("1366x768")
 
+        # Notas importadas ficam gravadas no banco local; a thread do Tk (pesquisa) e as de
+        # trabalho recebem cada uma a sua conexão
+        self.store = storage.NoteStore()
+
+        # Cópia comprimida e deduplicada de cada XML importado
+        self.archive = archive.XMLArchive(check_same_thread=False)
+
+        # Busca, importação e exportação rodam fora da thread do Tk
+        self.jobs = jobs.JobRunner(master, on_progress=self.show_progress, on_idle=self.hide_progress)
+
+        # Fechar a janela cancela os trabalhos: as threads do pool seguram o fim do processo até
+        # terminarem, e sem isso o programa continuaria rodando invisível até o fim da busca/importação
+        master.protocol("WM_DELETE_WINDOW", self.close)
+
         # Configurar tema do customtkinter
         ctk.set_appearance_mode("dark")  # Modos: "System" (padrão), "Dark", "Light"
         ctk.set_default_color_theme("blue")  # Temas: "blue" (padrão), "green", "dark-blue"
@@ -32,13 +86,40 @@ class XMLImporterApp:
         self.fetch_button.grid(row=0, column=3, padx=5, pady=10, sticky="ew")
 
         self.import_button = ctk.CTkButton(self.frame, text="Importar XML", command=self.import_xml)
-        self.import_button.grid(row=1, column=0, columnspan=2, pady=20, sticky="ew")
+        self.import_button.grid(row=1, column=0, padx=(0, 5), pady=20, sticky="ew")
+
+        self.bulk_fetch_button = ctk.CTkButton(self.frame, text="Buscar em lote", command=self.open_bulk_fetch_window)
+        self.bulk_fetch_button.grid(row=1, column=1, padx=(5, 0), pady=20, sticky="ew")
 
         self.export_button = ctk.CTkButton(self.frame, text="Exportar para PDF", command=self.export_to_pdf)
         self.export_button.grid(row=1, column=2, columnspan=2, pady=20, sticky="ew")
 
-        self.text_area = ctk.CTkTextbox(self.frame, width=100, height=30, font=("Courier", 12))
-        self.text_area.grid(row=2, column=0, columnspan=4, padx=5, pady=20, sticky="nsew")
+        # Documentos grandes são exibidos por janelas de linhas (ver viewer.XMLViewer)
+        self.xml_viewer = viewer.XMLViewer(self.frame, font=("Courier", 12))
+        self.xml_viewer.grid(row=2, column=0, columnspan=4, padx=5, pady=20, sticky="nsew")
+        self.text_area = self.xml_viewer.textbox
+        # Documento exibido; os arquivos temporários do visualizador ficam numa pasta removida ao fechar
+        self.viewer_lines = None
+        self.previewing = False  # primeiras linhas na tela, resto do documento ainda sendo formatado
+        self.viewer_dir = tempfile.mkdtemp(prefix='nfe-viewer-')
+
+        # Última URL usada na busca em lote, sugerida na próxima vez
+        self.bulk_url_template = ""
+
+        self.progress_bar = ctk.CTkProgressBar(self.frame)
+        self.progress_bar.set(0)
+        self.progress_bar.grid(row=3, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
+
+        self.cancel_button = ctk.CTkButton(self.frame, text="Cancelar", command=self.cancel_jobs, state="disabled")
+        self.cancel_button.grid(row=3, column=3, padx=5, pady=5, sticky="ew")
+
+        self.search_entry = ctk.CTkEntry(self.frame, placeholder_text="Pesquisar produto, emitente ou destinatário",
+                                         font=ctk.CTkFont(size=12))
+        self.search_entry.grid(row=4, column=0, columnspan=3, padx=5, pady=5, sticky="ew")
+        self.search_entry.bind("<Return>", lambda event: self.search_notes())
+
+        self.search_button = ctk.CTkButton(self.frame, text="Pesquisar", command=self.search_notes)
+        self.search_button.grid(row=4, column=3, padx=5, pady=5, sticky="ew")
 
         self.signature_label = ctk.CTkLabel(master, text="Desenvolvido por GNP Tech", font=ctk.CTkFont(size=10))
         self.signature_label.pack(side=ctk.BOTTOM, pady=10)
@@ -56,125 +137,294 @@ class XMLImporterApp:
             messagebox.showerror("Erro", "Por favor, insira um CNPJ válido.")
             return
 
-        try:
+        def fetch(job):
             xml_content = self.get_xml_from_cnpj(cnpj)
-            self.display_xml_content(xml_content)
-        except Exception as e:
+            job.report(0.5)
+            return self.format_xml(job, xml_content), xml_content
+
+        def done(result):
+            lines, xml_content = result
+            self.show_xml_lines(lines)
+            self.submit_store(lambda: xml_content)
+
+        def failed(e):
+            self.end_preview()
             messagebox.showerror("Erro", f"Ocorreu um erro ao buscar o XML do CNPJ:\n{e}")
 
+        self.jobs.submit(fetch, on_done=done, on_error=failed, on_cancel=self.end_preview)
+
+    def open_bulk_fetch_window(self):
+        bulk_window = ctk.CTkToplevel(self.master)
+        bulk_window.title("Buscar em lote")
+        bulk_window.geometry("500x400")
+
+        label = ctk.CTkLabel(bulk_window, text="Cole os CNPJs ou chaves de acesso (um por linha):")
+        label.pack(pady=10)
+
+        keys_text = ctk.CTkTextbox(bulk_window, height=250)
+        keys_text.pack(padx=10, pady=5, fill="both", expand=True)
+
+        url_label = ctk.CTkLabel(bulk_window, text="URL de consulta ({chave} é trocado por cada CNPJ/chave):")
+        url_label.pack(pady=(10, 0))
+
+        url_entry = ctk.CTkEntry(bulk_window)
+        url_entry.insert(0, self.bulk_url_template)
+        url_entry.pack(padx=10, pady=5, fill="x")
+
+        def load_file():
+            file_path = filedialog.askopenfilename(filetypes=[("Text files", "*.txt"), ("All files", "*.*")])
+            if file_path:
+                with open(file_path, "r") as file:
+                    keys_text.insert(ctk.END, file.read())
+
+        def fetch_all():
+            import sefaz
+            keys = sefaz.parse_keys(keys_text.get("1.0", ctk.END))
+            if not keys:
+                messagebox.showerror("Erro", "Nenhum CNPJ ou chave de acesso informado.")
+                return
+            url_template = url_entry.get().strip()
+            try:
+                sefaz.check_template(url_template)
+            except sefaz.SefazError as e:
+                messagebox.showerror("Erro", str(e))
+                return
+            self.bulk_url_template = url_template
+
+            def fetch(job):
+                def progress(done, total, key, error):
+                    job.report(done / total)
+                    job.check_cancelled()
+                return sefaz.bulk_fetch(keys, self.store, url_template=url_template, on_result=progress)
+
+            def done(results):
+                errors = sum(1 for key, data, error in results if error)
+                messagebox.showinfo("Busca em lote", f"{len(results) - errors} de {len(results)} documentos importados.")
+
+            bulk_window.destroy()
+            self.jobs.submit(
+                fetch,
+                on_done=done,
+                on_error=lambda e: messagebox.showerror("Erro", f"Ocorreu um erro na busca em lote:\n{e}"),
+            )
+
+        buttons = ctk.CTkFrame(bulk_window, fg_color='transparent')
+        buttons.pack(pady=10)
+        ctk.CTkButton(buttons, text="Carregar arquivo", command=load_file).pack(side=ctk.LEFT, padx=5)
+        ctk.CTkButton(buttons, text="Buscar", command=fetch_all).pack(side=ctk.LEFT, padx=5)
+
+    def close(self):
+        self.jobs.shutdown()
+        self.master.destroy()
+        if self.viewer_lines is not None:
+            self.viewer_lines.close()
+        shutil.rmtree(self.viewer_dir, ignore_errors=True)
+
+    def search_notes(self):
+        text = self.search_entry.get().strip()
+        if not text:
+            return
+        results = self.store.search(text)
+
+        results_window = ctk.CTkToplevel(self.master)
+        results_window.title(f"Pesquisa: {text}")
+        results_window.geometry("900x500")
+
+        label = ctk.CTkLabel(results_window, text=f"{len(results)} nota(s) encontrada(s)")
+        label.pack(pady=10)
+
+        results_text = ctk.CTkTextbox(results_window, font=("Courier", 12), wrap="none")
+        results_text.pack(padx=10, pady=5, fill="both", expand=True)
+        for chave, numero, serie, emissao, valor_total, trecho in results:
+            results_text.insert(ctk.END, f"{chave}  Nº {numero or ''}/{serie or ''}  {(emissao or '')[:10]}  "
+                                         f"R$ {valor_total or ''}\n    {trecho}\n")
+        results_text.configure(state="disabled")
+
     def get_xml_from_cnpj(self, cnpj):
-        url = f"https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?chNFe=43181007364617000107650010000006451120000727&nVersao=100&tpAmb=1&dhEmi=323031382d30392d30315431313a34323a31362d30333a3030&vNF=7.50&vICMS=0.00&digVal=645165725a5537766b33513978475a57704d7a4e793d&cIdToken=000001&cHashQRCode=DFEBEA4787BFF153CB7F4E5D805E71CA74D0AF4A"
-        
-        response = requests.get(url)
-        if response.status_code == 200:
-            return response.text
-        else:
-            raise Exception("Falha ao buscar o XML. Verifique se o CNPJ está correto ou tente novamente mais tarde.")
+        import sefaz
+        return sefaz.get_client().fetch_xml(sefaz.consulta_url(cnpj))
+
+    def format_xml(self, job, source):
+        # O XML indentado vai para um arquivo temporário aberto por mmap: só o índice de linhas
+        # fica em memória, sem a string formatada inteira e uma segunda cópia codificada. O primeiro
+        # bloco escrito já vai para a tela enquanto o resto do documento é formatado
+        fd, path = tempfile.mkstemp(suffix='.xml', dir=self.viewer_dir)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8', newline='\n') as out:
+                pretty.pretty_print(source, PreviewOutput(out, lambda text: job.call(self.show_preview, text)))
+            job.check_cancelled()
+            return viewer.LineStore.from_file(path)
+        except BaseException:
+            os.remove(path)
+            raise
+
+    def show_preview(self, text):
+        # Somente leitura até o documento inteiro chegar (ver show_xml_lines)
+        self.previewing = True
+        self.xml_viewer.show(viewer.LineStore.from_text(text))
+        self.text_area.configure(state="disabled")
+
+    def end_preview(self):
+        # Formatação com erro ou cancelada: volta ao documento exibido antes da prévia
+        if self.previewing:
+            self.previewing = False
+            self.xml_viewer.show(self.viewer_lines or viewer.LineStore(b''))
+
+    def show_xml_lines(self, lines):
+        # O documento anterior só é liberado depois que o novo já está na tela
+        previous, self.viewer_lines = self.viewer_lines, lines
+        self.previewing = False
+        self.xml_viewer.show(lines)
+        if previous is not None:
+            self.release_lines(previous)
+
+    def release_lines(self, lines):
+        lines.close()
+        if lines.path:
+            try:
+                os.remove(lines.path)
+            except OSError:
+                pass
 
     def display_xml_content(self, xml_content):
-        xml_dom = xml.dom.minidom.parseString(xml_content)
-        pretty_xml = xml_dom.toprettyxml()
-
-        self.text_area.delete("1.0", ctk.END)
-        self.text_area.insert(ctk.END, pretty_xml)
+        self.show_xml_lines(viewer.LineStore.from_text(pretty.pretty_xml(xml_content)))
+
+    def store_xml(self, xml_content):
+        # Documentos já arquivados (mesmos bytes ou mesmo conteúdo canônico) e já gravados no banco
+        # não são reprocessados; a nota é gravada antes de o XML entrar no arquivo (importer.ImportBatch)
+        raw = xml_content if isinstance(xml_content, bytes) else xml_content.encode('utf-8')
+        batch = importer.ImportBatch(self.store, self.archive)
+        known = self.archive.archived(archive.raw_digest(raw))
+        if known is not None:
+            imported = batch.add(None, known)
+        else:
+            data = self.parse_nfe(raw)
+            canonical = bool(data.chave) and self.archive.has_chave(data.chave)
+            imported = batch.add(data, archive.Prepared(raw, canonical=canonical))
+        batch.flush()
+        return imported is not None
+
+    def submit_store(self, load):
+        # A gravação no banco e no arquivo é um trabalho à parte: o documento já está na tela
+        def store(job):
+            xml_content = load()
+            job.report(0.5)
+            return self.store_xml(xml_content)
+
+        self.jobs.submit(
+            store,
+            on_error=lambda e: messagebox.showerror("Erro", f"Ocorreu um erro ao gravar a nota:\n{e}"),
+        )
 
     def import_xml(self):
-        file_path = filedialog.askopenfilename(filetypes=[("XML files", "*.xml")])
-        if file_path:
-            try:
-                with open(file_path, "r") as file:
-                    xml_content = file.read()
-                    self.display_xml_content(xml_content)
-            except Exception as e:
+        file_path = filedialog.askopenfilename(filetypes=[
+            ("XML ou pacotes", "*.xml *.zip *.tar *.tar.gz *.tgz"), ("XML files", "*.xml"), ("Pacotes", "*.zip *.tar.gz *.tgz"),
+        ])
+        if file_path and sources.is_bundle(file_path):
+            self.import_bundle(file_path)
+        elif file_path:
+            def read_file():
+                with open(file_path, "rb") as file:
+                    return file.read()
+
+            def done(lines):
+                self.show_xml_lines(lines)
+                self.submit_store(read_file)
+
+            def failed(e):
+                self.end_preview()
                 messagebox.showerror("Erro", f"Ocorreu um erro ao importar o arquivo XML:\n{e}")
 
-    def export_to_pdf(self):
-        xml_content = self.text_area.get("1.0", ctk.END)
+            self.jobs.submit(
+                lambda job: self.format_xml(job, file_path),
+                on_done=done,
+                on_error=failed,
+                on_cancel=self.end_preview,
+            )
+
+    def import_bundle(self, file_path):
+        # Pacote ZIP/TAR: os XML são lidos direto do pacote (sem extrair) e importados em paralelo
+        def run(job):
+            total = sources.count_members(file_path)
+            xml_archive = archive.XMLArchive()
+            try:
+                def progress(totals, name, error):
+                    if total:
+                        job.report(totals['arquivos'] / total)
+                    job.check_cancelled()
+                return importer.import_sources(sources.iter_bundle(file_path), self.store, xml_archive, on_result=progress)
+            finally:
+                xml_archive.close()
+
+        def done(totals):
+            messagebox.showinfo(
+                "Importação",
+                f"{totals['importados']} de {totals['arquivos']} notas importadas.\n"
+                f"{totals['duplicados']} já importadas antes, {totals['erros']} com erro.",
+            )
 
-        if not xml_content.strip():
-            messagebox.showerror("Erro", "Nenhum conteúdo XML para exportar.")
+        self.jobs.submit(
+            run,
+            on_done=done,
+            on_error=lambda e: messagebox.showerror("Erro", f"Ocorreu um erro ao importar o pacote:\n{e}"),
+        )
+
+    def export_to_pdf(self):
+        if self.previewing:
+            messagebox.showinfo("Exportar para PDF", "Aguarde o documento terminar de carregar.")
             return
 
+        lines = self.xml_viewer.store
+        if lines is not None:
+            # Documento grande: o trabalho lê o arquivo temporário (ou os bytes) direto, sem montar
+            # o texto inteiro na thread do Tk
+            xml_content = lines.path or lines.data
+        else:
+            xml_content = self.xml_viewer.get_text()
+            if not xml_content.strip():
+                messagebox.showerror("Erro", "Nenhum conteúdo XML para exportar.")
+                return
+
         file_path = filedialog.asksaveasfilename(defaultextension=".pdf", filetypes=[("PDF files", "*.pdf")])
         if file_path:
-            try:
-                self.create_pdf(file_path, xml_content)
-                messagebox.showinfo("Sucesso", "XML exportado para PDF com sucesso.")
-            except Exception as e:
-                messagebox.showerror("Erro", f"Ocorreu um erro ao exportar para PDF:\n{e}")
+            def export(job):
+                data = self.parse_nfe(xml_content)
+                job.report(0.3)
+                job.check_cancelled()
+                self.generate_danfe(data, file_path)
+
+            self.jobs.submit(
+                export,
+                on_done=lambda _: messagebox.showinfo("Sucesso", "XML exportado para PDF com sucesso."),
+                on_error=lambda e: messagebox.showerror("Erro", f"Ocorreu um erro ao exportar para PDF:\n{e}"),
+            )
+
+    def show_progress(self, fraction):
+        self.cancel_button.configure(state="normal")
+        if fraction is None:
+            # Progresso desconhecido até o trabalho informar a primeira etapa
+            self.progress_bar.configure(mode="indeterminate")
+            self.progress_bar.start()
+        else:
+            self.progress_bar.stop()
+            self.progress_bar.configure(mode="determinate")
+            self.progress_bar.set(fraction)
+
+    def hide_progress(self):
+        self.progress_bar.stop()
+        self.progress_bar.configure(mode="determinate")
+        self.progress_bar.set(0)
+        self.cancel_button.configure(state="disabled")
+
+    def cancel_jobs(self):
+        self.jobs.cancel_all()
 
     def parse_nfe(self, xml_content):
-        root = ET.fromstring(xml_content)
-        ns = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
-
-        data = {
-            'emitente': {
-                'nome': root.find('.//nfe:emit/nfe:xNome', ns).text,
-                'cnpj': root.find('.//nfe:emit/nfe:CNPJ', ns).text,
-                'endereco': root.find('.//nfe:emit/nfe:enderEmit/nfe:xLgr', ns).text,
-                'bairro': root.find('.//nfe:emit/nfe:enderEmit/nfe:xBairro', ns).text,
-                'cidade': root.find('.//nfe:emit/nfe:enderEmit/nfe:xMun', ns).text,
-                'uf': root.find('.//nfe:emit/nfe:enderEmit/nfe:UF', ns).text,
-            },
-            'destinatario': {
-                'nome': root.find('.//nfe:dest/nfe:xNome', ns).text,
-                'cnpj': root.find('.//nfe:dest/nfe:CNPJ', ns).text,
-                'endereco': root.find('.//nfe:dest/nfe:enderDest/nfe:xLgr', ns).text,
-                'bairro': root.find('.//nfe:dest/nfe:enderDest/nfe:xBairro', ns).text,
-                'cidade': root.find('.//nfe:dest/nfe:enderDest/nfe:xMun', ns).text,
-                'uf': root.find('.//nfe:dest/nfe:enderDest/nfe:UF', ns).text,
-            },
-            'produtos': []
-        }
-
-        for prod in root.findall('.//nfe:det', ns):
-            produto = {
-                'descricao': prod.find('.//nfe:prod/nfe:xProd', ns).text,
-                'quantidade': prod.find('.//nfe:prod/nfe:qCom', ns).text,
-                'valor': prod.find('.//nfe:prod/nfe:vProd', ns).text
-            }
-            data['produtos'].append(produto)
-
-        return data
+        return nfe.parse_nfe(xml_content)
 
     def generate_danfe(self, data, output_file):
-        c = canvas.Canvas(output_file, pagesize=A4)
-        width, height = A4
-
-        # Cabeçalho
-        c.setFont("Helvetica-Bold", 16)
-        c.drawString(20 * mm, height - 20 * mm, "DANFE")
-
-        # Dados do Emitente
-        c.setFont("Helvetica", 10)
-        c.drawString(20 * mm, height - 40 * mm, f"Emitente: {data['emitente']['nome']}")
-        c.drawString(20 * mm, height - 45 * mm, f"CNPJ: {data['emitente']['cnpj']}")
-        c.drawString(20 * mm, height - 50 * mm, f"Endereço: {data['emitente']['endereco']}, Bairro: {data['emitente']['bairro']}")
-        c.drawString(20 * mm, height - 55 * mm, f"Cidade: {data['emitente']['cidade']}, UF: {data['emitente']['uf']}")
-
-        # Dados do Destinatário
-        c.drawString(20 * mm, height - 70 * mm, f"Destinatário: {data['destinatario']['nome']}")
-        c.drawString(20 * mm, height - 75 * mm, f"CNPJ: {data['destinatario']['cnpj']}")
-        c.drawString(20 * mm, height - 80 * mm, f"Endereço: {data['destinatario']['endereco']}, Bairro: {data['destinatario']['bairro']}")
-        c.drawString(20 * mm, height - 85 * mm, f"Cidade: {data['destinatario']['cidade']}, UF: {data['destinatario']['uf']}")
-
-        # Tabela de Produtos
-        c.setFont("Helvetica-Bold", 12)
-        c.drawString(20 * mm, height - 100 * mm, "Produtos")
-        c.setFont("Helvetica", 10)
-
-        y = height - 110 * mm
-        c.drawString(20 * mm, y, "Descrição")
-        c.drawString(100 * mm, y, "Quantidade")
-        c.drawString(130 * mm, y, "Valor")
-
-        for produto in data['produtos']:
-            y -= 5 * mm
-            c.drawString(20 * mm, y, produto['descricao'])
-            c.drawString(100 * mm, y, produto['quantidade'])
-            c.drawString(130 * mm, y, produto['valor'])
-
-        c.save()
+        import danfe
+        danfe.generate_danfe(data, output_file)
 
     def create_pdf(self, file_path, xml_content):
         data = self.parse_nfe(xml_content)
@@ -187,7 +437,7 @@ class LoginWindow:
         self.master.geometry("1366x768")
 
         # Conexão com banco de dados SQLite
-        self.conn = sqlite3.connect('database/users.db')
+        self.conn = db.connect('database/users.db')
         self.create_table()
 
        # Frame para o conteúdo (fundo transparente)
@@ -279,6 +529,11 @@ class LoginWindow:
         main_app_window.mainloop()
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        import cli
+        sys.exit(cli.main(sys.argv[1:]))
+
     root = ctk.CTk()
     login_app = LoginWindow(root)
+    root.after(PRELOAD_DELAY_MS, preload_modules)
     root.mainloop()
@@ -0,0 +1,154 @@
+import sys
+from array import array
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Quantidades (qCom) têm até 4 casas decimais: guardadas como inteiro em décimos de milésimo
+QUANTITY_PLACES = 4
+
+# Marca de valor ausente nas colunas inteiras
+MISSING = -2 ** 63
+
+PARTY_FIELDS = ('nome', 'cnpj', 'endereco', 'bairro', 'cidade', 'uf')
+
+
+def _scaled(text, places):
+    if text is None:
+        return None
+    # Caminho rápido para o formato usual do XML ('123.45'), sem passar por Decimal
+    whole, _, fraction = text.partition('.')
+    if len(fraction) <= places and whole.isdigit() and (not fraction or fraction.isdigit()):
+        return int(whole + fraction.ljust(places, '0'))
+    try:
+        return int(Decimal(text).scaleb(places).to_integral_value(ROUND_HALF_UP))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def to_cents(text):
+    # '1234.56' -> 123456
+    return _scaled(text, 2)
+
+
+def to_quantity(text):
+    # '3.5' -> 35000
+    return _scaled(text, QUANTITY_PLACES)
+
+
+def format_cents(cents):
+    if cents is None:
+        return None
+    sign = '-' if cents < 0 else ''
+    return f"{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}"
+
+
+def format_quantity(quantity):
+    return None if quantity is None else str(Decimal(quantity).scaleb(-QUANTITY_PLACES))
+
+
+class Party:
+    __slots__ = PARTY_FIELDS
+
+    def __init__(self, nome=None, cnpj=None, endereco=None, bairro=None, cidade=None, uf=None):
+        self.nome = nome
+        self.cnpj = cnpj
+        self.endereco = endereco
+        self.bairro = bairro
+        self.cidade = cidade
+        self.uf = uf
+
+
+class Item:
+    # Visão de um item: quantidade em Decimal, valor em centavos
+    __slots__ = ('descricao', 'quantidade', 'valor')
+
+    def __init__(self, descricao, quantidade, valor):
+        self.descricao = descricao
+        self.quantidade = quantidade
+        self.valor = valor
+
+
+# Colunas de impostos por item, em centavos
+TAX_COLUMNS = ('icms', 'ipi', 'pis', 'cofins')
+
+
+def _intern(text):
+    return sys.intern(text) if text else text
+
+
+class ItemColumns:
+    # Itens de uma nota em colunas: textos numa lista (repetidos compartilhados) e
+    # quantidade/valores como inteiros de 64 bits, em vez de um dicionário de strings por item
+    __slots__ = ('descricao', 'ncm', 'cfop', 'quantidade', 'valor') + TAX_COLUMNS
+
+    def __init__(self):
+        self.descricao = []
+        self.ncm = []
+        self.cfop = []
+        self.quantidade = array('q')
+        self.valor = array('q')
+        self.icms = array('q')
+        self.ipi = array('q')
+        self.pis = array('q')
+        self.cofins = array('q')
+
+    def append(self, descricao, quantidade, valor, ncm=None, cfop=None, icms=None, ipi=None, pis=None, cofins=None):
+        # quantidade já escalada (to_quantity) e valores em centavos; None quando ausentes
+        self.descricao.append(_intern(descricao))
+        self.ncm.append(_intern(ncm))
+        self.cfop.append(_intern(cfop))
+        for column, value in ((self.quantidade, quantidade), (self.valor, valor), (self.icms, icms),
+                              (self.ipi, ipi), (self.pis, pis), (self.cofins, cofins)):
+            column.append(MISSING if value is None else value)
+
+    def add(self, record):
+        self.append(**record)
+
+    def quantity_at(self, index):
+        quantity = self.quantidade[index]
+        return None if quantity == MISSING else quantity
+
+    def value_at(self, index):
+        value = self.valor[index]
+        return None if value == MISSING else value
+
+    def total_cents(self):
+        return sum(value for value in self.valor if value != MISSING)
+
+    def _item(self, index):
+        quantity = self.quantity_at(index)
+        return Item(
+            self.descricao[index],
+            None if quantity is None else Decimal(quantity).scaleb(-QUANTITY_PLACES),
+            self.value_at(index),
+        )
+
+    def __len__(self):
+        return len(self.descricao)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self._item(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self._item(index)
+
+    def __iter__(self):
+        return (self._item(i) for i in range(len(self)))
+
+
+class Note:
+    __slots__ = ('chave', 'numero', 'serie', 'emissao', 'valor_total', 'emitente', 'destinatario', 'produtos')
+
+    def __init__(self, chave=None, numero=None, serie=None, emissao=None, valor_total=None,
+                 emitente=None, destinatario=None, produtos=None):
+        self.chave = chave
+        self.numero = numero
+        self.serie = serie
+        self.emissao = emissao
+        # Em centavos
+        self.valor_total = valor_total
+        self.emitente = emitente if emitente is not None else Party()
+        self.destinatario = destinatario if destinatario is not None else Party()
+        self.produtos = produtos if produtos is not None else ItemColumns()
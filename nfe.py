@@ -0,0 +1,196 @@
+import xml.etree.ElementTree as ET
+
+import model
+from model import to_cents, to_quantity
+
+NS = '{http://www.portalfiscal.inf.br/nfe}'
+
+INF_NFE = NS + 'infNFe'
+
+# Mapa declarativo dos campos extraídos: seção -> (atributo da nota, modo, classe, campos).
+# Cada campo é (nome, caminho relativo à seção, conversor aplicado ao texto ou None);
+# '*' no caminho aceita qualquer tag naquele nível (ex.: ICMS00, ICMS20, ICMSSN102...).
+# Modos: 'merge' grava os campos na própria nota, 'one' cria um objeto da classe com a
+# primeira ocorrência e 'many' acumula todas as ocorrências numa coleção da classe
+FIELD_MAP = {
+    'ide': (None, 'merge', None, (
+        ('numero', 'nNF', None),
+        ('serie', 'serie', None),
+        ('emissao', 'dhEmi', None),
+        ('emissao', 'dEmi', None),
+    )),
+    'emit': ('emitente', 'one', model.Party, (
+        ('nome', 'xNome', None),
+        ('cnpj', 'CNPJ', None),
+        ('endereco', 'enderEmit/xLgr', None),
+        ('bairro', 'enderEmit/xBairro', None),
+        ('cidade', 'enderEmit/xMun', None),
+        ('uf', 'enderEmit/UF', None),
+    )),
+    'dest': ('destinatario', 'one', model.Party, (
+        ('nome', 'xNome', None),
+        ('cnpj', 'CNPJ', None),
+        ('endereco', 'enderDest/xLgr', None),
+        ('bairro', 'enderDest/xBairro', None),
+        ('cidade', 'enderDest/xMun', None),
+        ('uf', 'enderDest/UF', None),
+    )),
+    'det': ('produtos', 'many', model.ItemColumns, (
+        ('descricao', 'prod/xProd', None),
+        ('ncm', 'prod/NCM', None),
+        ('cfop', 'prod/CFOP', None),
+        ('quantidade', 'prod/qCom', to_quantity),
+        ('valor', 'prod/vProd', to_cents),
+        ('icms', 'imposto/ICMS/*/vICMS', to_cents),
+        ('ipi', 'imposto/IPI/*/vIPI', to_cents),
+        ('pis', 'imposto/PIS/*/vPIS', to_cents),
+        ('cofins', 'imposto/COFINS/*/vCOFINS', to_cents),
+    )),
+    'total': (None, 'merge', None, (
+        ('valor_total', 'ICMSTot/vNF', to_cents),
+    )),
+}
+
+WILDCARD = '*'
+
+READ_SIZE = 64 * 1024
+
+# Seções lidas acumuladas antes de serem retiradas do infNFe de uma vez
+DROP_BATCH = 256
+
+
+class Section:
+    __slots__ = ('target', 'mode', 'factory', 'keys', 'plan')
+
+    def __init__(self, target, mode, factory, fields):
+        self.target = target
+        self.mode = mode
+        self.factory = factory
+        self.keys = tuple(dict.fromkeys(name for name, _, _ in fields))
+        # Caminhos compilados numa árvore de tags qualificadas: {tag: subárvore | (nome, conversor)}
+        self.plan = {}
+        for name, path, convert in fields:
+            node = self.plan
+            *parents, leaf = path.split('/')
+            for part in parents:
+                node = node.setdefault(_qualified(part), {})
+            node[_qualified(leaf)] = (name, convert)
+
+    def extract(self, elem, record):
+        _extract(elem, self.plan, record)
+        return record
+
+
+def _qualified(part):
+    return part if part == WILDCARD else NS + part
+
+
+def _extract(elem, plan, record):
+    wildcard = plan.get(WILDCARD)
+    for child in elem:
+        target = plan.get(child.tag, wildcard)
+        if target is None:
+            continue
+        if type(target) is dict:
+            _extract(child, target, record)
+        else:
+            name, convert = target
+            value = child.text
+            if convert is not None and value is not None:
+                value = convert(value)
+            record[name] = value
+
+
+class Extractor:
+    # Plano de extração compilado uma vez a partir do FIELD_MAP e reaproveitado em todos os documentos
+    def __init__(self, field_map=FIELD_MAP):
+        self.sections = {NS + tag: Section(*spec) for tag, spec in field_map.items()}
+        self.merge_keys = ('chave',) + tuple(
+            key for section in self.sections.values() if section.mode == 'merge' for key in section.keys
+        )
+
+    def parse(self, source):
+        data = dict.fromkeys(self.merge_keys)
+        found = {}
+        sections = self.sections
+        inf_nfe = None
+        finished = 0
+
+        # Passagem única: cada seção é lida no seu evento 'end' e descartada em seguida, de modo que
+        # a memória não cresce com o número de itens. Os eventos 'start' só servem para achar o
+        # infNFe (chave de acesso e pai das seções); depois dele o parser passa a gerar só 'end'
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        for chunk in _read_chunks(source):
+            # Bloco vazio no fim: fecha o parser (documento incompleto gera erro aqui)
+            if chunk:
+                parser.feed(chunk)
+            else:
+                parser.close()
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    if inf_nfe is None and elem.tag == INF_NFE:
+                        inf_nfe = elem
+                        # Id = 'NFe' + chave de acesso de 44 dígitos
+                        data['chave'] = elem.get('Id', '').removeprefix('NFe') or None
+                        # Os eventos já enfileirados (o resto do bloco lido) continuam chegando aos pares
+                        parser._parser._setevents(parser._events_queue, ('end',))
+                    continue
+
+                section = sections.get(elem.tag)
+                if section is None:
+                    continue
+                mode = section.mode
+                if mode == 'merge':
+                    section.extract(elem, data)
+                elif mode == 'many':
+                    collection = found.get(section.target)
+                    if collection is None:
+                        collection = found[section.target] = section.factory()
+                    collection.add(section.extract(elem, dict.fromkeys(section.keys)))
+                elif section.target not in found:
+                    found[section.target] = section.factory(**section.extract(elem, dict.fromkeys(section.keys)))
+
+                # O parser lê adiante dos eventos, então os irmãos seguintes já podem estar presos ao
+                # infNFe: a seção lida é sempre esvaziada, e as já lidas saem do infNFe em lotes
+                elem.clear()
+                if inf_nfe is not None:
+                    finished += 1
+                    if finished >= DROP_BATCH:
+                        _drop_through(inf_nfe, elem)
+                        finished = 0
+
+        if inf_nfe is not None:
+            # Restos do último lote
+            del inf_nfe[:]
+        return model.Note(**data, **found)
+
+
+def _drop_through(parent, elem):
+    # Retira do pai todos os filhos até elem (inclusive), que já terminaram
+    for index, child in enumerate(parent):
+        if child is elem:
+            del parent[:index + 1]
+            return
+
+
+def _read_chunks(source):
+    # Aceita o conteúdo (str/bytes), um caminho de arquivo ou um arquivo aberto; termina num bloco vazio
+    if isinstance(source, bytes) or (isinstance(source, str) and '<' in source[:1024]):
+        for pos in range(0, len(source), READ_SIZE):
+            yield source[pos:pos + READ_SIZE]
+    elif hasattr(source, 'read'):
+        while chunk := source.read(READ_SIZE):
+            yield chunk
+    else:
+        with open(source, 'rb') as file:
+            while chunk := file.read(READ_SIZE):
+                yield chunk
+    yield b''
+
+
+# Montado uma única vez por processo
+EXTRACTOR = Extractor()
+
+
+def parse_nfe(source):
+    return EXTRACTOR.parse(source)
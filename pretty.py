@@ -0,0 +1,120 @@
+import io
+from xml.parsers import expat
+
+READ_SIZE = 64 * 1024
+WRITE_SIZE = 64 * 1024
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+
+def _escape_text(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _escape_attr(value):
+    return (value.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+            .replace('"', '&quot;').replace('\n', '&#10;').replace('\t', '&#9;').replace('\r', '&#13;'))
+
+
+class _PrettyWriter:
+    # Recebe os eventos do expat e escreve a saída indentada em blocos
+    def __init__(self, out, indent):
+        self.out = out
+        self.indent = indent
+        self.parts = []
+        self.size = 0
+        self.depth = 0
+        self.pending = None  # tag de abertura ainda sem filhos conhecidos
+        self.text = []
+
+    def write(self, data):
+        self.parts.append(data)
+        self.size += len(data)
+        if self.size >= WRITE_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self.out.write(''.join(self.parts))
+            self.parts = []
+            self.size = 0
+
+    def _close_pending(self):
+        # O elemento pendente tem filhos: fecha a tag de abertura e escreve o texto misto, se houver
+        if self.pending is not None:
+            self.write(self.pending + '>\n')
+            self.pending = None
+        text = ''.join(self.text).strip()
+        self.text = []
+        if text:
+            self.write(self.indent * self.depth + _escape_text(text) + '\n')
+
+    def start(self, name, attrs):
+        self._close_pending()
+        tag = [self.indent * self.depth, '<', name]
+        for pos in range(0, len(attrs), 2):
+            tag.append(f' {attrs[pos]}="{_escape_attr(attrs[pos + 1])}"')
+        self.pending = ''.join(tag)
+        self.depth += 1
+
+    def end(self, name):
+        self.depth -= 1
+        if self.pending is not None:
+            # Sem elementos filhos: <tag>texto</tag> ou <tag/> numa única linha (texto preservado,
+            # inclusive só de espaços: <x> </x> não vira <x/>)
+            text = ''.join(self.text)
+            self.text = []
+            if text:
+                self.write(f'{self.pending}>{_escape_text(text)}</{name}>\n')
+            else:
+                self.write(self.pending + '/>\n')
+            self.pending = None
+        else:
+            self._close_pending()
+            self.write(f'{self.indent * self.depth}</{name}>\n')
+
+    def characters(self, data):
+        self.text.append(data)
+
+    def comment(self, data):
+        self._close_pending()
+        self.write(f'{self.indent * self.depth}<!--{data}-->\n')
+
+    def instruction(self, target, data):
+        self._close_pending()
+        self.write(f'{self.indent * self.depth}<?{target} {data}?>\n')
+
+
+def pretty_print(source, out, indent='\t'):
+    writer = _PrettyWriter(out, indent)
+    parser = expat.ParserCreate()
+    parser.ordered_attributes = True
+    parser.buffer_text = True
+    parser.StartElementHandler = writer.start
+    parser.EndElementHandler = writer.end
+    parser.CharacterDataHandler = writer.characters
+    parser.CommentHandler = writer.comment
+    parser.ProcessingInstructionHandler = writer.instruction
+
+    writer.write(XML_DECLARATION)
+    if isinstance(source, bytes) or (isinstance(source, str) and '<' in source[:1024]):
+        for pos in range(0, len(source), READ_SIZE):
+            parser.Parse(source[pos:pos + READ_SIZE], False)
+        parser.Parse(b'', True)
+    elif hasattr(source, 'read'):
+        parser.ParseFile(source)
+    else:
+        with open(source, 'rb') as file:
+            parser.ParseFile(file)
+    writer.flush()
+
+
+def pretty_xml(source, indent='\t'):
+    out = io.StringIO()
+    pretty_print(source, out, indent)
+    return out.getvalue()
+
+
+def pretty_file(source_path, output_path, indent='\t'):
+    with open(output_path, 'w', encoding='utf-8', newline='\n') as out:
+        pretty_print(source_path, out, indent)
@@ -0,0 +1,145 @@
+from array import array
+
+# O NumPy só é importado quando um relatório é montado (ver _require_numpy): importar este
+# módulo não custa a carga do NumPy a quem só precisa das constantes
+np = None
+
+from model import MISSING, TAX_COLUMNS
+
+# Dimensões de agrupamento: NCM e CFOP do item, CNPJ do emitente e mês (AAAA-MM) da emissão
+DIMENSIONS = ('ncm', 'cfop', 'cnpj', 'mes')
+
+# Colunas somadas, na ordem dos relatórios
+VALUE_COLUMNS = ('valor',) + TAX_COLUMNS
+# Até este número de combinações a agregação usa contagem direta em vez de ordenação
+DENSE_GROUPS = 1 << 22
+
+VALUE_LABELS = {'valor': 'vProd', 'icms': 'vICMS', 'ipi': 'vIPI', 'pis': 'vPIS', 'cofins': 'vCOFINS'}
+
+
+def _exact_bincount(keys, values, size):
+    # bincount soma em float64, exato enquanto nenhuma soma passa de 2**53; acima disso
+    # cada valor é separado em duas metades de 24 bits, somadas à parte
+    if not len(values) or int(np.abs(values).max()) * len(values) < 2 ** 53:
+        return np.bincount(keys, weights=values, minlength=size).astype(np.int64)
+    high = np.bincount(keys, weights=values >> 24, minlength=size).astype(np.int64)
+    low = np.bincount(keys, weights=values & 0xFFFFFF, minlength=size).astype(np.int64)
+    return (high << 24) + low
+
+
+def _require_numpy():
+    # Sem o NumPy os relatórios ficam indisponíveis, o resto do programa funciona
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise RuntimeError("Os relatórios precisam do NumPy (pip install numpy).") from None
+        np = numpy
+
+
+class _Encoder:
+    # Codificação por dicionário: cada valor distinto vira um inteiro
+    __slots__ = ('codes', 'values')
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class ItemTable:
+    # Todos os itens de várias notas em colunas NumPy: códigos int32 para as dimensões
+    # (com o dicionário de valores ao lado) e centavos em int64 para os valores
+    def __init__(self, codes, dictionaries, values):
+        self.codes = codes
+        self.dictionaries = dictionaries
+        self.values = values
+
+    @classmethod
+    def from_notes(cls, notes):
+        _require_numpy()
+        encoders = {name: _Encoder() for name in DIMENSIONS}
+        codes = {name: array('i') for name in DIMENSIONS}
+        values = {name: array('q') for name in VALUE_COLUMNS}
+
+        for data in notes:
+            produtos = data.produtos
+            count = len(produtos)
+            if not count:
+                continue
+            # Dimensões da nota são repetidas para cada item
+            codes['cnpj'].extend([encoders['cnpj'].encode(data.emitente.cnpj)] * count)
+            codes['mes'].extend([encoders['mes'].encode(data.emissao[:7] if data.emissao else None)] * count)
+            codes['ncm'].extend(map(encoders['ncm'].encode, produtos.ncm))
+            codes['cfop'].extend(map(encoders['cfop'].encode, produtos.cfop))
+            for name in VALUE_COLUMNS:
+                values[name].extend(getattr(produtos, name))
+
+        table_codes = {name: np.frombuffer(column, dtype=np.int32) for name, column in codes.items()}
+        table_values = {}
+        for name, column in values.items():
+            column = np.frombuffer(column, dtype=np.int64)
+            # Valores ausentes entram como zero nas somas
+            table_values[name] = np.where(column == MISSING, 0, column)
+        dictionaries = {name: encoder.values for name, encoder in encoders.items()}
+        return cls(table_codes, dictionaries, table_values)
+
+    def __len__(self):
+        return len(next(iter(self.values.values())))
+
+    def group_by(self, *keys):
+        # Soma vetorizada por combinação de dimensões: os códigos são combinados numa única
+        # chave int64 e cada coluna é somada por chave de uma vez, sem laço por item
+        _require_numpy()
+        for key in keys:
+            if key not in DIMENSIONS:
+                raise ValueError(f"Dimensão desconhecida: {key}")
+        if not len(self):
+            return []
+
+        combined = np.zeros(len(self), dtype=np.int64)
+        space = 1
+        for key in keys:
+            size = max(1, len(self.dictionaries[key]))
+            combined = combined * size + self.codes[key]
+            space *= size
+
+        if space <= max(DENSE_GROUPS, len(self)):
+            # Poucas combinações possíveis: contagem direta por chave (bincount), em O(n)
+            counts = np.bincount(combined, minlength=space)
+            group_keys = np.flatnonzero(counts)
+            counts = counts[group_keys]
+            sums = {name: _exact_bincount(combined, column, space)[group_keys] for name, column in self.values.items()}
+        else:
+            # Muitas combinações: ordena uma vez e soma cada trecho contíguo (reduceat)
+            order = np.argsort(combined)
+            combined = combined[order]
+            starts = np.flatnonzero(np.r_[True, combined[1:] != combined[:-1]])
+            group_keys = combined[starts]
+            counts = np.diff(np.r_[starts, len(combined)])
+            sums = {name: np.add.reduceat(column[order], starts) for name, column in self.values.items()}
+
+        # Decodifica as chaves de volta para os valores de cada dimensão
+        labels = []
+        remainder = group_keys
+        for key in reversed(keys):
+            size = max(1, len(self.dictionaries[key]))
+            remainder, codes = np.divmod(remainder, size)
+            labels.append(np.array(self.dictionaries[key] or [None], dtype=object)[codes])
+        labels.reverse()
+
+        # Maiores valores primeiro
+        order = np.argsort(-sums['valor'], kind='stable')
+        columns = [label[order].tolist() for label in labels] + [counts[order].tolist()]
+        columns += [sums[name][order].tolist() for name in VALUE_COLUMNS]
+        return list(zip(*columns))
+
+    def totals(self):
+        return {name: int(column.sum()) for name, column in self.values.items()}
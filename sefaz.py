@@ -0,0 +1,225 @@
+import asyncio
+import re
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import http_cache
+import nfe
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+RETRIES = 3
+BACKOFF_FACTOR = 0.5
+POOL_SIZE = 10
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# URL de consulta; '{chave}' (quando presente) é trocado pelo CNPJ/chave buscado
+CONSULTA_URL = "https://www.sefaz.rs.gov.br/NFCE/NFCE-COM.aspx?chNFe=43181007364617000107650010000006451120000727&nVersao=100&tpAmb=1&dhEmi=323031382d30392d30315431313a34323a31362d30333a3030&vNF=7.50&vICMS=0.00&digVal=645165725a5537766b33513978475a57704d7a4e793d&cIdToken=000001&cHashQRCode=DFEBEA4787BFF153CB7F4E5D805E71CA74D0AF4A"
+
+# Busca em lote
+CONCURRENCY = 8
+RATE_PER_HOST = 5.0
+STORE_BATCH_SIZE = 100
+
+
+class SefazError(Exception):
+    pass
+
+
+class SefazClient:
+    # Sessão única com pool de conexões keep-alive e novas tentativas com backoff exponencial
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, retries=RETRIES,
+                 backoff_factor=BACKOFF_FACTOR, pool_size=POOL_SIZE, cache=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.cache = cache
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS,
+            allowed_methods=frozenset({'GET', 'HEAD'}),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    def get(self, url, headers=None):
+        return self.session.get(url, headers=headers, timeout=self.timeout)
+
+    def _cached_entry(self, url):
+        # Entrada do cache que ainda é uma NF-e; respostas inválidas gravadas antes são descartadas
+        entry = self.cache.get(url) if self.cache is not None else None
+        if entry is None:
+            return None, None
+        try:
+            return entry, parse_note(entry.body)
+        except SefazError:
+            self.cache.discard(url)
+            return None, None
+
+    def cached_note(self, url):
+        # (xml, nota) do cache que pode ser usado sem consultar a SEFAZ (ou None)
+        entry, data = self._cached_entry(url)
+        if entry is not None and entry.is_fresh(self.cache.max_age):
+            return entry.body, data
+        return None
+
+    def fetch_note(self, url):
+        # (xml, nota). Só respostas que são NF-e entram no cache: uma página de erro com status 200
+        # não fica guardada (sem validade, ela impediria para sempre a busca daquela chave)
+        entry, data = self._cached_entry(url)
+        if entry is not None and entry.is_fresh(self.cache.max_age):
+            # Acerto no cache: nenhuma requisição à SEFAZ
+            return entry.body, data
+
+        headers = entry.conditional_headers() if entry is not None else None
+        try:
+            response = self.get(url, headers=headers)
+        except requests.RequestException as e:
+            raise SefazError(f"Falha de conexão com a SEFAZ: {e}") from e
+
+        if response.status_code == 304 and entry is not None:
+            self.cache.revalidated(url)
+            return entry.body, data
+        if response.status_code != 200:
+            raise SefazError("Falha ao buscar o XML. Verifique se o CNPJ está correto ou tente novamente mais tarde.")
+        data = parse_note(response.text)
+        if self.cache is not None:
+            self.cache.put(url, response.text, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return response.text, data
+
+    def fetch_xml(self, url):
+        return self.fetch_note(url)[0]
+
+    def close(self):
+        self.session.close()
+
+
+def parse_note(xml_content):
+    # Nota da resposta, ou SefazError se ela não é uma NF-e (página de erro, consulta sem resultado)
+    try:
+        data = nfe.parse_nfe(xml_content)
+    except Exception as e:
+        raise SefazError("A resposta não é uma NF-e.") from e
+    if not data.chave:
+        raise SefazError("A resposta não é uma NF-e.")
+    return data
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    # Cliente compartilhado pelo processo inteiro, para reaproveitar as conexões
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SefazClient(cache=http_cache.ResponseCache())
+        return _client
+
+
+
+def consulta_url(key, url_template=CONSULTA_URL):
+    return url_template.replace('{chave}', key)
+
+
+def check_template(url_template):
+    # Na busca em lote cada item precisa da sua URL: sem '{chave}' todos baixariam o mesmo documento
+    if not url_template or '{chave}' not in url_template:
+        raise SefazError("A URL de consulta precisa conter {chave}, trocado por cada CNPJ/chave buscado.")
+
+
+def parse_keys(text):
+    # Aceita CNPJs/chaves separados por linha, vírgula, ponto e vírgula ou espaço, com ou sem máscara
+    keys = []
+    for token in re.split(r'[\s,;]+', text):
+        key = re.sub(r'\D', '', token)
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+class TokenBucket:
+    # Limita a taxa de requisições: 'rate' fichas por segundo, rajadas de até 'capacity'
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+async def fetch_many(keys, store=None, client=None, url_template=None,
+                     concurrency=CONCURRENCY, rate=RATE_PER_HOST, on_result=None):
+    # O requests é síncrono: cada GET roda numa thread (asyncio.to_thread) sobre a sessão
+    # compartilhada, enquanto o asyncio controla a concorrência e a taxa por host
+    check_template(url_template)
+    if client is None:
+        client = get_client() if concurrency <= POOL_SIZE else SefazClient(pool_size=concurrency, cache=get_client().cache)
+    semaphore = asyncio.Semaphore(concurrency)
+    buckets = {}
+    pending = []
+    results = []
+
+    def flush():
+        if store is not None and pending:
+            store.save_notes(pending)
+        pending.clear()
+
+    async def fetch_one(key):
+        url = consulta_url(key, url_template)
+        host = urlsplit(url).netloc
+        if host not in buckets:
+            buckets[host] = TokenBucket(rate)
+        async with semaphore:
+            try:
+                # Acertos no cache não consomem fichas do limite de taxa
+                note = client.cached_note(url)
+                if note is None:
+                    await buckets[host].acquire()
+                    note = await asyncio.to_thread(client.fetch_note, url)
+                data = note[1]
+            except Exception as e:
+                return key, None, e
+        return key, data, None
+
+    for task in asyncio.as_completed([fetch_one(key) for key in keys]):
+        key, data, error = await task
+        results.append((key, data, error))
+        if data is not None:
+            # Gravadas conforme chegam, em pequenos lotes por transação
+            pending.append(data)
+            if len(pending) >= STORE_BATCH_SIZE:
+                flush()
+        if on_result:
+            on_result(len(results), len(keys), key, error)
+    flush()
+    return results
+
+
+def bulk_fetch(keys, store=None, **kwargs):
+    return asyncio.run(fetch_many(keys, store, **kwargs))
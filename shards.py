@@ -0,0 +1,228 @@
+import glob
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, timedelta
+
+import db
+import storage
+
+SHARDS_DIR = 'database/notas'
+
+# Notas sem data de emissão (ou com data inválida) ficam num arquivo à parte
+UNDATED = 'sem-data'
+
+SHARD_PATTERN = re.compile(r'notas-(\d{4}-\d{2}|' + UNDATED + r')\.db$')
+MONTH_PATTERN = re.compile(r'\d{4}-(0[1-9]|1[0-2])$')
+
+NOTE_COLUMNS = 'n.chave, n.numero, n.serie, n.emissao, n.valor_total'
+
+
+def shard_key(emissao):
+    # 'AAAA-MM' da emissão (dhEmi), ou UNDATED
+    month = emissao[:7] if emissao else None
+    return month if month and MONTH_PATTERN.match(month) else UNDATED
+
+
+def month_of_chave(chave):
+    # A chave de acesso traz AAMM da emissão nas posições 3 a 6
+    if chave and len(chave) == 44 and chave.isdigit() and 1 <= int(chave[4:6]) <= 12:
+        return f"20{chave[2:4]}-{chave[4:6]}"
+    return None
+
+
+def _months(start, end):
+    # Meses 'AAAA-MM' de start até end (datas 'AAAA-MM-DD' ou 'AAAA-MM'), inclusive
+    year, month = int(start[:4]), int(start[5:7])
+    last = (int(end[:4]), int(end[5:7]))
+    while (year, month) <= last:
+        yield f"{year:04d}-{month:02d}"
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _day_after(day):
+    # Limite superior exclusivo: emissao é 'AAAA-MM-DDThh:mm:ss-03:00', comparada como texto
+    if len(day) == 7:
+        year, month = int(day[:4]), int(day[5:7])
+        return f"{year + 1:04d}-01-01" if month == 12 else f"{year:04d}-{month + 1:02d}-01"
+    return (date.fromisoformat(day[:10]) + timedelta(days=1)).isoformat()
+
+
+class ShardedNoteStore:
+    # Notas em um arquivo SQLite por mês de emissão (database/notas/notas-AAAA-MM.db), cada um
+    # com o mesmo esquema do NoteStore. Backup, VACUUM e reindexação passam a ser por mês, e as
+    # consultas abrem (ATTACH) só os meses do período pedido: o mês corrente não paga pelo histórico
+    def __init__(self, directory=SHARDS_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()
+        self.stores = {}
+        # Banco vazio em memória por thread, onde os meses consultados são anexados
+        self.router = db.ConnectionManager(':memory:', pragmas={})
+
+    def shard_path(self, key):
+        return os.path.join(self.directory, f'notas-{key}.db')
+
+    def shard_keys(self):
+        keys = []
+        for path in glob.glob(os.path.join(self.directory, 'notas-*.db')):
+            match = SHARD_PATTERN.search(os.path.basename(path))
+            if match:
+                keys.append(match.group(1))
+        return sorted(keys)
+
+    def shards_between(self, start=None, end=None):
+        # Meses existentes que cruzam o período; sem período, todos (inclusive os sem data)
+        existing = self.shard_keys()
+        if start is None and end is None:
+            return existing
+        months = [key for key in existing if key != UNDATED]
+        if not months:
+            return []
+        wanted = set(_months(start or months[0], end or months[-1]))
+        return [key for key in months if key in wanted]
+
+    def store(self, key):
+        # NoteStore do mês, criado na primeira gravação
+        with self.lock:
+            store = self.stores.get(key)
+            if store is None:
+                store = self.stores[key] = storage.NoteStore(self.shard_path(key))
+            return store
+
+    def save_notes(self, notes):
+        by_month = {}
+        for data in notes:
+            by_month.setdefault(shard_key(data.emissao), []).append(data)
+        return sum(self.store(key).save_notes(group) for key, group in sorted(by_month.items()))
+
+    def save_note(self, data):
+        return self.save_notes([data])
+
+    def has_note(self, chave):
+        # A nota está no mês da chave de acesso (ou entre as sem data); sem mês na chave, procura em todos
+        keys = self.shard_keys()
+        hint = month_of_chave(chave)
+        candidates = (hint, UNDATED) if hint else keys
+        return any(key in keys and self.store(key).has_note(chave) for key in candidates)
+
+    def load_note(self, chave):
+        # O mês da chave de acesso indica o arquivo; os demais só são lidos se a nota não estiver lá
+        hint = month_of_chave(chave)
+        keys = self.shard_keys()
+        if hint in keys:
+            keys.remove(hint)
+            keys.insert(0, hint)
+        for key in keys:
+            data = self.store(key).load_note(chave)
+            if data is not None:
+                return data
+        return None
+
+    def _query(self, keys, build, params, order=None, limit=None):
+        # Anexa os meses em grupos (o SQLite limita o número de ATTACH por conexão), executa a
+        # mesma consulta em cada um com UNION ALL e desanexa ao terminar
+        conn = self.router.get()
+        group_size = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+        rows = []
+        for index in range(0, len(keys), group_size):
+            group = keys[index:index + group_size]
+            aliases = [f's{position}' for position in range(len(group))]
+            for alias, key in zip(aliases, group):
+                conn.execute("ATTACH DATABASE ? AS " + alias, (self.shard_path(key),))
+            try:
+                sql = ' UNION ALL '.join(build(alias) for alias in aliases)
+                if order:
+                    sql = f"SELECT * FROM ({sql}) ORDER BY {order}"
+                if limit:
+                    sql += f" LIMIT {int(limit)}"
+                rows.extend(conn.execute(sql, params * len(aliases)).fetchall())
+            finally:
+                for alias in aliases:
+                    conn.execute("DETACH DATABASE " + alias)
+        return rows
+
+    def notes_between(self, start=None, end=None, cnpj=None):
+        # (chave, numero, serie, emissao, valor_total) das notas emitidas no período, em ordem de emissão
+        conditions = []
+        params = []
+        if start:
+            conditions.append("n.emissao >= ?")
+            params.append(start)
+        if end:
+            conditions.append("n.emissao < ?")
+            params.append(_day_after(end))
+        if cnpj:
+            conditions.append("(n.emitente_cnpj = ? OR n.destinatario_cnpj = ?)")
+            params.extend((cnpj, cnpj))
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        def build(alias):
+            return f"SELECT {NOTE_COLUMNS} FROM {alias}.notes n{where}"
+
+        rows = self._query(self.shards_between(start, end), build, tuple(params))
+        return sorted(rows, key=lambda row: row[3] or '')
+
+    def find_by_cnpj(self, cnpj, start=None, end=None):
+        return self.notes_between(start, end, cnpj)
+
+    def search(self, text, start=None, end=None, limit=storage.SEARCH_LIMIT):
+        query = storage.search_query(text)
+        if not query:
+            return []
+        period = ''
+        params = [query]
+        if start:
+            period += " AND n.emissao >= ?"
+            params.append(start)
+        if end:
+            period += " AND n.emissao < ?"
+            params.append(_day_after(end))
+
+        def build(alias):
+            return (f"SELECT {NOTE_COLUMNS}, snippet(notes_fts, -1, '[', ']', '...', 8) AS trecho, rank "
+                    f"FROM {alias}.notes_fts JOIN {alias}.notes n ON n.id = notes_fts.rowid "
+                    f"WHERE notes_fts MATCH ?{period}")
+
+        # Cada grupo de meses traz os seus melhores; a ordem final junta todos pelo rank
+        rows = self._query(self.shards_between(start, end), build, tuple(params), order='rank', limit=limit)
+        rows.sort(key=lambda row: row[-1])
+        return [row[:-1] for row in rows[:limit]]
+
+    def rebuild_summaries(self):
+        for key in self.shard_keys():
+            self.store(key).rebuild_summaries()
+
+    def summary(self, dimensao, period='mes', start=None, end=None, grupo=None):
+        # Resumos de cada mês do período (mesmo formato de NoteStore.summary); um grupo pode
+        # aparecer em mais de um arquivo (notas sem data), então as linhas são somadas aqui
+        params = storage.summary_query(dimensao, period, start, end, grupo)[1]
+
+        def build(alias):
+            return storage.summary_query(dimensao, period, start, end, grupo, table=f'{alias}.summaries')[0]
+
+        totals = {}
+        for periodo, name, *values in self._query(self.shards_between(start, end), build, params):
+            current = totals.get((periodo, name))
+            totals[periodo, name] = values if current is None else [a + b for a, b in zip(current, values)]
+        rows = [key + tuple(values) for key, values in totals.items()]
+        rows.sort(key=lambda row: (row[0], -row[4]))
+        return rows
+
+    def stats(self):
+        # (mês, notas, bytes do arquivo, incluindo o WAL ainda não transferido para ele)
+        result = []
+        for key in self.shard_keys():
+            path = self.shard_path(key)
+            count = self.store(key).conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+            size = sum(os.path.getsize(name) for name in (path, path + '-wal') if os.path.exists(name))
+            result.append((key, count, size))
+        return result
+
+    def close(self):
+        with self.lock:
+            stores, self.stores = self.stores, {}
+        for store in stores.values():
+            store.close()
+        self.router.close()
@@ -0,0 +1,119 @@
+import glob
+import io
+import os
+import tarfile
+import zipfile
+from functools import lru_cache
+
+# Pacotes aceitos no lugar de arquivos XML soltos
+ZIP_SUFFIXES = ('.zip',)
+TAR_SUFFIXES = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+
+def is_bundle(path):
+    name = path.lower()
+    return name.endswith(ZIP_SUFFIXES + TAR_SUFFIXES)
+
+
+def _is_xml(name):
+    return name.lower().endswith('.xml')
+
+
+@lru_cache(maxsize=8)
+def _open_zip(path):
+    # Um ZipFile por pacote em cada processo: os membros são lidos por acesso direto
+    return zipfile.ZipFile(path)
+
+
+class ZipMember:
+    # Referência a um XML dentro de um ZIP; o processo que o importa lê e descomprime
+    # o membro por conta própria, em fluxo, sem extrair nada para o disco
+    __slots__ = ('container', 'name', 'size')
+
+    def __init__(self, container, name, size):
+        self.container = container
+        self.name = name
+        self.size = size
+
+    def open(self):
+        return _open_zip(self.container).open(self.name)
+
+    def __str__(self):
+        return f"{self.container}:{self.name}"
+
+
+class TarMember:
+    # Um TAR comprimido só pode ser lido em sequência: o processo principal lê cada membro
+    # uma vez e entrega o conteúdo ao processo que o importa
+    __slots__ = ('container', 'name', 'data')
+
+    def __init__(self, container, name, data):
+        self.container = container
+        self.name = name
+        self.data = data
+
+    @property
+    def size(self):
+        return len(self.data)
+
+    def open(self):
+        return io.BytesIO(self.data)
+
+    def __str__(self):
+        return f"{self.container}:{self.name}"
+
+
+def iter_zip(path):
+    for info in _open_zip(path).infolist():
+        if not info.is_dir() and _is_xml(info.filename):
+            yield ZipMember(path, info.filename, info.file_size)
+
+
+def iter_tar(path):
+    # Modo 'r|*': leitura em fluxo, sem índice e sem guardar os membros já lidos
+    with tarfile.open(path, mode='r|*') as tar:
+        for member in tar:
+            if member.isfile() and _is_xml(member.name):
+                yield TarMember(path, member.name, tar.extractfile(member).read())
+
+
+def iter_bundle(path):
+    if path.lower().endswith(ZIP_SUFFIXES):
+        return iter_zip(path)
+    return iter_tar(path)
+
+
+def count_members(path):
+    # Total de XMLs do pacote quando dá para saber sem ler tudo (ZIP); None para TAR
+    if path.lower().endswith(ZIP_SUFFIXES):
+        return sum(1 for info in _open_zip(path).infolist() if not info.is_dir() and _is_xml(info.filename))
+    return None
+
+
+def find_inputs(targets):
+    # Arquivos XML e pacotes (ZIP/TAR) dos diretórios ou padrões glob informados
+    paths = []
+    for target in targets:
+        if os.path.isdir(target):
+            candidates = glob.glob(os.path.join(target, '**', '*'), recursive=True)
+        else:
+            candidates = glob.glob(target, recursive=True)
+        paths.extend(path for path in candidates if os.path.isfile(path) and (_is_xml(path) or is_bundle(path)))
+    return sorted(set(paths))
+
+
+def iter_sources(paths):
+    # Caminhos de XML soltos e os membros XML de cada pacote, sob demanda
+    for path in paths:
+        if is_bundle(path):
+            yield from iter_bundle(path)
+        else:
+            yield path
+
+
+def open_source(source):
+    return open(source, 'rb') if isinstance(source, str) else source.open()
+
+
+def source_size(source):
+    return os.path.getsize(source) if isinstance(source, str) else source.size
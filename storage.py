@@ -0,0 +1,436 @@
+import re
+from datetime import datetime
+from operator import add
+
+import db
+import model
+from model import TAX_COLUMNS, format_cents, format_quantity, to_cents, to_quantity
+
+DATABASE_PATH = 'database/notes.db'
+
+PARTY_COLUMNS = ('cnpj', 'nome', 'endereco', 'bairro', 'cidade', 'uf')
+
+# Campos das partes indexados na busca textual
+SEARCH_PARTY_FIELDS = ('nome', 'endereco', 'bairro', 'cidade', 'uf')
+
+SEARCH_LIMIT = 200
+
+# Colunas gravadas da nota; o id (INTEGER PRIMARY KEY) liga a nota à sua linha na busca textual
+NOTE_FIELDS = ('chave', 'numero', 'serie', 'emissao', 'emitente_cnpj', 'destinatario_cnpj', 'valor_total',
+               'importado_em')
+
+NOTES_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY,
+        chave TEXT NOT NULL UNIQUE,
+        numero TEXT,
+        serie TEXT,
+        emissao TEXT,
+        emitente_cnpj TEXT,
+        destinatario_cnpj TEXT,
+        valor_total TEXT,
+        importado_em TEXT NOT NULL
+    );
+'''
+
+# Reimportar uma nota atualiza a linha existente, mantendo o id
+UPSERT_NOTE_SQL = (
+    f"INSERT INTO notes ({', '.join(NOTE_FIELDS)}) VALUES ({', '.join('?' * len(NOTE_FIELDS))}) "
+    f"ON CONFLICT (chave) DO UPDATE SET {', '.join(f'{name} = excluded.{name}' for name in NOTE_FIELDS[1:])}"
+)
+
+# Colunas dos itens acrescentadas depois da primeira versão do banco (ALTER TABLE nas bases antigas)
+ITEM_EXTRA_COLUMNS = ('ncm', 'cfop') + TAX_COLUMNS
+
+# Resumos mantidos a cada gravação: por emitente, destinatário, NCM, CFOP e o total ('dia', grupo
+# vazio), cada um por dia ('AAAA-MM-DD') e por mês ('AAAA-MM')
+SUMMARY_DIMENSIONS = ('emitente', 'destinatario', 'ncm', 'cfop', 'dia')
+SUMMARY_VALUES = ('notas', 'itens', 'valor') + TAX_COLUMNS
+# Tamanho do texto do período em cada granularidade
+SUMMARY_PERIODS = {'mes': 7, 'dia': 10}
+
+
+def _cents_sql(column):
+    # Texto decimal gravado nos itens -> centavos inteiros (exato para valores abaixo de 2**53 / 100)
+    return f"CAST(round({column} * 100) AS INTEGER)"
+
+
+# Contribuição das notas filtradas por {where} em cada linha de resumo, multiplicada pelo sinal
+# (+1 na reconstrução, -1 ao retirar a versão anterior de uma nota reimportada). Notas sem data
+# de emissão ficam no período ''
+_ITEM_SUMS = ', '.join(f"SUM({_cents_sql('i.' + name)}) AS {name}" for name in ('valor',) + TAX_COLUMNS)
+_VALUE_NAMES = ', '.join(('itens', 'valor') + TAX_COLUMNS)
+SUMMARY_SQL = f'''
+    WITH per_note AS (
+        SELECT n.chave, coalesce(n.emitente_cnpj, '') AS emitente, coalesce(n.destinatario_cnpj, '') AS destinatario,
+               coalesce(substr(n.emissao, 1, 10), '') AS dia, COUNT(i.n_item) AS itens, {_ITEM_SUMS}
+        FROM notes n LEFT JOIN items i ON i.chave = n.chave
+        WHERE {{where}}
+        GROUP BY n.chave
+    ),
+    per_item_group AS (
+        SELECT 'ncm' AS dimensao, coalesce(i.ncm, '') AS grupo, coalesce(substr(n.emissao, 1, 10), '') AS dia,
+               COUNT(*) AS itens, {_ITEM_SUMS}
+        FROM notes n JOIN items i ON i.chave = n.chave
+        WHERE {{where}}
+        GROUP BY n.chave, i.ncm
+        UNION ALL
+        SELECT 'cfop', coalesce(i.cfop, ''), coalesce(substr(n.emissao, 1, 10), ''), COUNT(*), {_ITEM_SUMS}
+        FROM notes n JOIN items i ON i.chave = n.chave
+        WHERE {{where}}
+        GROUP BY n.chave, i.cfop
+    ),
+    contributions AS (
+        SELECT 'emitente' AS dimensao, emitente AS grupo, dia, {_VALUE_NAMES} FROM per_note
+        UNION ALL SELECT 'destinatario', destinatario, dia, {_VALUE_NAMES} FROM per_note
+        UNION ALL SELECT 'dia', '', dia, {_VALUE_NAMES} FROM per_note
+        UNION ALL SELECT dimensao, grupo, dia, {_VALUE_NAMES} FROM per_item_group
+    ),
+    periods AS (
+        SELECT dimensao, grupo, dia AS periodo, {_VALUE_NAMES} FROM contributions
+        UNION ALL SELECT dimensao, grupo, substr(dia, 1, 7), {_VALUE_NAMES} FROM contributions WHERE dia <> ''
+    )
+    INSERT INTO summaries (dimensao, periodo, grupo, {', '.join(SUMMARY_VALUES)})
+    SELECT dimensao, periodo, grupo, {{sign}} * COUNT(*),
+           {', '.join(f'{{sign}} * coalesce(SUM({name}), 0)' for name in ('itens', 'valor') + TAX_COLUMNS)}
+    FROM periods WHERE true
+    GROUP BY dimensao, periodo, grupo
+    ON CONFLICT (dimensao, periodo, grupo) DO UPDATE SET
+        {', '.join(f'{name} = {name} + excluded.{name}' for name in SUMMARY_VALUES)}
+'''
+BATCH_FILTER = "n.chave IN (SELECT chave FROM temp.summary_batch)"
+
+UPSERT_SUMMARY_SQL = f'''
+    INSERT INTO summaries (dimensao, periodo, grupo, {', '.join(SUMMARY_VALUES)})
+    VALUES (?, ?, ?, {', '.join('?' * len(SUMMARY_VALUES))})
+    ON CONFLICT (dimensao, periodo, grupo) DO UPDATE SET
+        {', '.join(f'{name} = {name} + excluded.{name}' for name in SUMMARY_VALUES)}
+'''
+
+
+def _cents_at(column, index):
+    value = column[index]
+    return None if value == model.MISSING else value
+
+
+def note_summaries(notes):
+    # Mesmas linhas de SUMMARY_SQL, calculadas dos centavos já em memória: as notas novas não
+    # precisam ser relidas do banco. Retorna {(dimensao, periodo, grupo): [notas, itens, valor, ...]}
+    totals = {}
+    value_names = ('valor',) + TAX_COLUMNS
+    for data in notes:
+        produtos = data.produtos
+        columns = [getattr(produtos, name) for name in value_names]
+        # Itens agrupados por NCM e por CFOP: [notas, itens, valores...], a nota conta uma vez por grupo
+        groups = {}
+        for ncm, cfop, *values in zip(produtos.ncm, produtos.cfop, *columns):
+            if model.MISSING in values:
+                values = [0 if value == model.MISSING else value for value in values]
+            for key in (('ncm', ncm or ''), ('cfop', cfop or '')):
+                current = groups.get(key)
+                if current is None:
+                    groups[key] = [1, 1, *values]
+                else:
+                    current[1] += 1
+                    current[2:] = map(add, current[2:], values)
+        note_values = [1, len(produtos)]
+        for column in columns:
+            note_values.append(sum(value for value in column if value != model.MISSING)
+                               if model.MISSING in column else sum(column))
+        for dimensao in ('emitente', 'destinatario'):
+            groups[dimensao, getattr(data, dimensao).cnpj or ''] = note_values
+        groups['dia', ''] = note_values
+
+        day = (data.emissao or '')[:10]
+        for periodo in ((day, day[:7]) if day else ('',)):
+            for (dimensao, grupo), values in groups.items():
+                key = (dimensao, periodo, grupo)
+                current = totals.get(key)
+                if current is None:
+                    totals[key] = list(values)
+                else:
+                    current[:] = map(add, current, values)
+    return totals
+
+
+class NoteStore:
+    # Pode ser usado por várias threads: cada uma recebe a sua conexão (db.ConnectionManager)
+    def __init__(self, path=DATABASE_PATH, pragmas=None):
+        self.connections = db.ConnectionManager(path, pragmas)
+        self.create_tables()
+
+    @property
+    def conn(self):
+        return self.connections.get()
+
+    def create_tables(self):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'notes_fts'")
+        has_search_index = cursor.fetchone() is not None
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'summaries'")
+        has_summaries = cursor.fetchone() is not None
+        note_columns = {row[1] for row in cursor.execute("PRAGMA table_info(notes)")}
+        if note_columns and 'id' not in note_columns:
+            # Bases anteriores ao id: a busca textual usava o rowid implícito de notes, que um VACUUM
+            # pode renumerar. A tabela é recriada com o id explícito e o índice de busca refeito
+            fields = ', '.join(NOTE_FIELDS)
+            cursor.executescript(f'''
+                BEGIN;
+                {NOTES_SCHEMA.format(name='notes_new')}
+                INSERT INTO notes_new (id, {fields}) SELECT rowid, {fields} FROM notes;
+                DROP TABLE notes;
+                ALTER TABLE notes_new RENAME TO notes;
+                COMMIT;
+            ''')
+            has_search_index = False
+        cursor.executescript(NOTES_SCHEMA.format(name='notes') + '''
+            CREATE TABLE IF NOT EXISTS parties (
+                chave TEXT NOT NULL REFERENCES notes(chave),
+                papel TEXT NOT NULL,
+                cnpj TEXT,
+                nome TEXT,
+                endereco TEXT,
+                bairro TEXT,
+                cidade TEXT,
+                uf TEXT,
+                PRIMARY KEY (chave, papel)
+            );
+
+            CREATE TABLE IF NOT EXISTS items (
+                chave TEXT NOT NULL REFERENCES notes(chave),
+                n_item INTEGER NOT NULL,
+                descricao TEXT,
+                quantidade TEXT,
+                valor TEXT,
+                ncm TEXT,
+                cfop TEXT,
+                icms TEXT,
+                ipi TEXT,
+                pis TEXT,
+                cofins TEXT,
+                PRIMARY KEY (chave, n_item)
+            );
+
+            -- Totais pré-agregados (valores em centavos), atualizados na transação de cada gravação
+            CREATE TABLE IF NOT EXISTS summaries (
+                dimensao TEXT NOT NULL,
+                periodo TEXT NOT NULL,
+                grupo TEXT NOT NULL,
+                notas INTEGER NOT NULL,
+                itens INTEGER NOT NULL,
+                valor INTEGER NOT NULL,
+                icms INTEGER NOT NULL,
+                ipi INTEGER NOT NULL,
+                pis INTEGER NOT NULL,
+                cofins INTEGER NOT NULL,
+                PRIMARY KEY (dimensao, periodo, grupo)
+            ) WITHOUT ROWID;
+
+            CREATE INDEX IF NOT EXISTS idx_notes_emissao ON notes (emissao);
+            CREATE INDEX IF NOT EXISTS idx_parties_cnpj ON parties (cnpj);
+            CREATE INDEX IF NOT EXISTS idx_parties_uf ON parties (uf);
+            CREATE INDEX IF NOT EXISTS idx_summaries_grupo ON summaries (dimensao, grupo, periodo);
+
+            -- Busca textual: uma linha por nota, com rowid igual ao id da tabela notes
+            CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                produtos, partes, tokenize = 'unicode61 remove_diacritics 2'
+            );
+        ''')
+        # Bases anteriores às colunas de NCM, CFOP e impostos dos itens
+        existing = {row[1] for row in cursor.execute("PRAGMA table_info(items)")}
+        for column in ITEM_EXTRA_COLUMNS:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE items ADD COLUMN {column} TEXT")
+        self.conn.commit()
+        if not has_search_index:
+            # Bases criadas antes da busca: indexa as notas já importadas
+            self.rebuild_search_index()
+        if not has_summaries:
+            # Bases criadas antes dos resumos (itens antigos sem NCM/CFOP entram no grupo '')
+            self.rebuild_summaries()
+
+    def rebuild_search_index(self):
+        with self.conn:
+            self.conn.execute("DELETE FROM notes_fts")
+            self.conn.execute('''
+                INSERT INTO notes_fts (rowid, produtos, partes)
+                SELECT n.id,
+                    (SELECT group_concat(descricao, ' ') FROM items i WHERE i.chave = n.chave),
+                    (SELECT group_concat(coalesce(nome, '') || ' ' || coalesce(endereco, '') || ' ' || coalesce(bairro, '')
+                            || ' ' || coalesce(cidade, '') || ' ' || coalesce(uf, ''), ' ')
+                     FROM parties p WHERE p.chave = n.chave)
+                FROM notes n
+            ''')
+
+    def _add_summaries(self, where, sign):
+        self.conn.execute(SUMMARY_SQL.format(where=where, sign=int(sign)))
+
+    def rebuild_summaries(self):
+        # Recalcula todos os resumos a partir das notas e itens gravados
+        with self.conn:
+            self.conn.execute("DELETE FROM summaries")
+            self._add_summaries('true', 1)
+
+    def save_notes(self, notes):
+        # Todas as notas entram numa única transação, com inserções em lote;
+        # se a mesma chave aparecer mais de uma vez, vale a última
+        notes = list({data.chave: data for data in notes if data.chave}.values())
+        if not notes:
+            return 0
+
+        now = datetime.now().isoformat(timespec='seconds')
+        note_rows = []
+        party_rows = []
+        item_rows = []
+        search_rows = []
+        for data in notes:
+            chave = data.chave
+            note_rows.append((
+                chave, data.numero, data.serie, data.emissao,
+                data.emitente.cnpj, data.destinatario.cnpj, format_cents(data.valor_total), now,
+            ))
+            for papel in ('emitente', 'destinatario'):
+                party = getattr(data, papel)
+                party_rows.append((chave, papel) + tuple(getattr(party, column) for column in PARTY_COLUMNS))
+            # Valores gravados como texto decimal, no mesmo formato das bases já existentes
+            produtos = data.produtos
+            for index, descricao in enumerate(produtos.descricao):
+                item_rows.append((chave, index + 1, descricao, format_quantity(produtos.quantity_at(index)),
+                                  format_cents(produtos.value_at(index)), produtos.ncm[index], produtos.cfop[index])
+                                 + tuple(format_cents(_cents_at(getattr(produtos, name), index)) for name in TAX_COLUMNS))
+            search_rows.append((
+                ' '.join(filter(None, produtos.descricao)),
+                ' '.join(filter(None, (getattr(party, field) for party in (data.emitente, data.destinatario)
+                                       for field in SEARCH_PARTY_FIELDS))),
+                chave,
+            ))
+
+        chaves = [(row[0],) for row in note_rows]
+        conn = self.conn
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS summary_batch (chave TEXT PRIMARY KEY)")
+        # BEGIN IMMEDIATE: a transação lê as notas antes da primeira escrita; se começasse como leitura,
+        # um commit de outro processo nesse meio faria o SQLite recusar a escrita (SQLITE_BUSY) na hora,
+        # sem esperar o busy timeout. Assim o lock de escrita é pedido (e esperado) logo no início
+        conn.execute("BEGIN IMMEDIATE")
+        with conn:
+            # Resumos mantidos na mesma transação: as notas do lote que já estavam gravadas têm a
+            # contribuição anterior retirada antes de serem substituídas
+            conn.execute("DELETE FROM temp.summary_batch")
+            conn.executemany("INSERT INTO temp.summary_batch VALUES (?)", chaves)
+            replaced = conn.execute(f"SELECT COUNT(*) FROM notes n WHERE {BATCH_FILTER}").fetchone()[0]
+            if replaced:
+                self._add_summaries(BATCH_FILTER, -1)
+            # Reimportar uma nota substitui a versão anterior (inclusive na busca textual,
+            # que é atualizada na mesma transação pelo id da nota)
+            self.conn.executemany(
+                "DELETE FROM notes_fts WHERE rowid = (SELECT id FROM notes WHERE chave = ?)", chaves
+            )
+            self.conn.executemany("DELETE FROM items WHERE chave = ?", chaves)
+            self.conn.executemany("DELETE FROM parties WHERE chave = ?", chaves)
+            self.conn.executemany(UPSERT_NOTE_SQL, note_rows)
+            self.conn.executemany("INSERT INTO parties VALUES (?, ?, ?, ?, ?, ?, ?, ?)", party_rows)
+            self.conn.executemany(
+                "INSERT INTO items (chave, n_item, descricao, quantidade, valor, ncm, cfop, icms, ipi, pis, cofins) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                item_rows,
+            )
+            self.conn.executemany(
+                "INSERT INTO notes_fts (rowid, produtos, partes) SELECT id, ?, ? FROM notes WHERE chave = ?",
+                search_rows,
+            )
+            conn.executemany(UPSERT_SUMMARY_SQL, [key + tuple(values) for key, values in note_summaries(notes).items()])
+            if replaced:
+                conn.execute("DELETE FROM summaries WHERE notas = 0")
+        return len(note_rows)
+
+    def save_note(self, data):
+        return self.save_notes([data])
+
+    def find_by_cnpj(self, cnpj):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT DISTINCT n.chave, n.numero, n.serie, n.emissao, n.valor_total
+            FROM parties p JOIN notes n ON n.chave = p.chave
+            WHERE p.cnpj = ?
+            ORDER BY n.emissao
+        ''', (cnpj,))
+        return cursor.fetchall()
+
+    def search(self, text, limit=SEARCH_LIMIT):
+        # Notas cujas descrições de produtos ou nomes/endereços das partes contêm todas as
+        # palavras digitadas (cada palavra também casa como prefixo), das mais relevantes
+        query = search_query(text)
+        if not query:
+            return []
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            SELECT n.chave, n.numero, n.serie, n.emissao, n.valor_total,
+                   snippet(notes_fts, -1, '[', ']', '...', 8)
+            FROM notes_fts JOIN notes n ON n.id = notes_fts.rowid
+            WHERE notes_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        ''', (query, limit))
+        return cursor.fetchall()
+
+    def has_note(self, chave):
+        return self.conn.execute("SELECT 1 FROM notes WHERE chave = ?", (chave,)).fetchone() is not None
+
+    def load_note(self, chave):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT numero, serie, emissao, valor_total FROM notes WHERE chave = ?", (chave,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+
+        data = model.Note(chave, row[0], row[1], row[2], to_cents(row[3]))
+        cursor.execute("SELECT papel, cnpj, nome, endereco, bairro, cidade, uf FROM parties WHERE chave = ?", (chave,))
+        for papel, *values in cursor.fetchall():
+            setattr(data, papel, model.Party(**dict(zip(PARTY_COLUMNS, values))))
+        cursor.execute("SELECT descricao, quantidade, valor, ncm, cfop, icms, ipi, pis, cofins FROM items "
+                       "WHERE chave = ? ORDER BY n_item", (chave,))
+        for descricao, quantidade, valor, ncm, cfop, *taxes in cursor.fetchall():
+            data.produtos.append(descricao, to_quantity(quantidade), to_cents(valor), ncm, cfop,
+                                 *(to_cents(value) for value in taxes))
+        return data
+
+    def summary(self, dimensao, period='mes', start=None, end=None, grupo=None):
+        # Linhas (periodo, grupo, notas, itens, valor, icms, ipi, pis, cofins) com valores em centavos,
+        # lidas da tabela de resumos sem tocar nos itens. period: 'mes' (AAAA-MM) ou 'dia' (AAAA-MM-DD)
+        sql, params = summary_query(dimensao, period, start, end, grupo)
+        return self.conn.execute(sql + " ORDER BY periodo, valor DESC", params).fetchall()
+
+    def close(self):
+        self.connections.close()
+
+
+def summary_query(dimensao, period='mes', start=None, end=None, grupo=None, table='summaries'):
+    if dimensao not in SUMMARY_DIMENSIONS:
+        raise ValueError(f"Dimensão desconhecida: {dimensao}")
+    if period not in SUMMARY_PERIODS:
+        raise ValueError(f"Período desconhecido: {period}")
+    conditions = ["dimensao = ?"]
+    params = [dimensao]
+    if start or end:
+        conditions.append("length(periodo) = ?")
+    else:
+        # Sem período pedido, as notas sem data de emissão aparecem no período ''
+        conditions.append("length(periodo) IN (?, 0)")
+    params.append(SUMMARY_PERIODS[period])
+    # Limites comparados no tamanho do período: '2024-03-15' vira '2024-03' nos resumos por mês
+    if start:
+        conditions.append("periodo >= ?")
+        params.append(start[:SUMMARY_PERIODS[period]])
+    if end:
+        conditions.append("periodo <= ?")
+        params.append(end[:SUMMARY_PERIODS[period]])
+    if grupo is not None:
+        conditions.append("grupo = ?")
+        params.append(grupo)
+    sql = f"SELECT periodo, grupo, {', '.join(SUMMARY_VALUES)} FROM {table} WHERE {' AND '.join(conditions)}"
+    return sql, tuple(params)
+
+
+def search_query(text):
+    # Cada palavra vira um termo entre aspas (sem operadores do FTS5) com busca por prefixo
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
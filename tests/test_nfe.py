@@ -0,0 +1,65 @@
+# Leitura em fluxo do nfe.Extractor sobre notas grandes do gerador de benchmarks.
+# Uso: python -m unittest discover -s tests -t .
+import io
+import unittest
+import xml.etree.ElementTree as ET
+from unittest import mock
+
+import nfe
+from benchmarks import corpus
+
+ITEMS = 5000
+
+
+class RecordingParser(ET.XMLPullParser):
+    # Guarda o infNFe visto pelo parser e os itens ainda presos a ele quando o infNFe termina
+    inf_nfe = None
+    attached = None
+
+    def read_events(self):
+        for event, elem in super().read_events():
+            if elem.tag == nfe.INF_NFE:
+                if event == 'start':
+                    RecordingParser.inf_nfe = elem
+                else:
+                    RecordingParser.attached = elem.findall(nfe.NS + 'det')
+            yield event, elem
+
+
+class StreamingParseTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.xml_content = corpus.build_note(ITEMS, seed=1).encode('utf-8')
+
+    def parse(self, source):
+        RecordingParser.inf_nfe = RecordingParser.attached = None
+        with mock.patch.object(ET, 'XMLPullParser', RecordingParser):
+            data = nfe.parse_nfe(source)
+        self.assertIsNotNone(RecordingParser.inf_nfe)
+        return data, RecordingParser.inf_nfe
+
+    def assert_no_items_left(self, source):
+        data, inf_nfe = self.parse(source)
+        self.assertEqual(len(data.produtos.descricao), ITEMS)
+        self.assertEqual(inf_nfe.findall(nfe.NS + 'det'), [])
+        # Durante a leitura ficam presos no máximo os itens de um lote, já esvaziados
+        self.assertLess(len(RecordingParser.attached), nfe.DROP_BATCH)
+        self.assertTrue(all(len(elem) == 0 for elem in RecordingParser.attached))
+
+    def test_content_leaves_no_det_in_inf_nfe(self):
+        self.assert_no_items_left(self.xml_content)
+
+    def test_file_leaves_no_det_in_inf_nfe(self):
+        self.assert_no_items_left(io.BytesIO(self.xml_content))
+
+    def test_same_result_as_full_tree(self):
+        data, inf_nfe = self.parse(self.xml_content)
+        root = ET.fromstring(self.xml_content)
+        tree_inf_nfe = root.find(f'.//{nfe.INF_NFE}')
+        self.assertEqual(data.chave, tree_inf_nfe.get('Id').removeprefix('NFe'))
+        descricoes = [elem.text for elem in tree_inf_nfe.iterfind(f'{nfe.NS}det/{nfe.NS}prod/{nfe.NS}xProd')]
+        self.assertEqual(list(data.produtos.descricao), descricoes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+# Cliente da SEFAZ contra o servidor local de benchmarks.fake_sefaz (sem rede).
+# Uso: python -m unittest discover -s tests -t .
+import unittest
+
+import sefaz
+from benchmarks import fake_sefaz
+
+
+class SefazClientTest(unittest.TestCase):
+    def start(self, **kwargs):
+        server = fake_sefaz.start_server(**kwargs)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server, f'http://127.0.0.1:{server.server_port}/nfe'
+
+    def client(self, **kwargs):
+        # Sem cache em disco e sem espera entre tentativas
+        client = sefaz.SefazClient(backoff_factor=0, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_retries_5xx_on_one_connection(self):
+        server, url = self.start(fail_first=2)
+        xml_content = self.client().fetch_xml(url)
+        self.assertEqual(xml_content.encode('utf-8'), server.body)
+        self.assertEqual(server.stats['requests'], 3)
+        self.assertEqual(server.stats['connections'], 1)
+
+    def test_gzip_response_is_decoded(self):
+        server, url = self.start()
+        xml_content, data = self.client().fetch_note(url)
+        self.assertEqual(xml_content.encode('utf-8'), server.body)
+        self.assertTrue(data.chave)
+        self.assertEqual(server.stats['gzip'], 1)
+
+    def test_connection_reused_between_fetches(self):
+        server, url = self.start()
+        client = self.client()
+        for _ in range(3):
+            client.fetch_xml(url)
+        self.assertEqual(server.stats['requests'], 3)
+        self.assertEqual(server.stats['connections'], 1)
+
+    def test_retries_exhausted_raises(self):
+        server, url = self.start(fail_first=10)
+        with self.assertRaises(sefaz.SefazError):
+            self.client(retries=2).fetch_xml(url)
+        self.assertEqual(server.stats['requests'], 3)
+
+    def test_read_timeout_raises(self):
+        server, url = self.start(delay=0.5)
+        with self.assertRaises(sefaz.SefazError):
+            self.client(read_timeout=0.1, retries=1).fetch_xml(url)
+
+    def test_bulk_fetch_one_url_per_key(self):
+        server, url = self.start()
+        results = sefaz.bulk_fetch(['1', '2', '3'], client=self.client(), url_template=url + '?chNFe={chave}')
+        self.assertEqual([error for key, data, error in results], [None] * 3)
+        self.assertEqual(sorted(server.attempts), ['/nfe?chNFe=1', '/nfe?chNFe=2', '/nfe?chNFe=3'])
+
+    def test_bulk_fetch_rejects_template_without_chave(self):
+        server, url = self.start()
+        with self.assertRaises(sefaz.SefazError):
+            sefaz.bulk_fetch(['1', '2'], client=self.client(), url_template=url)
+        self.assertEqual(server.stats['requests'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import mmap
+import os
+import tkinter.font as tkfont
+from array import array
+from itertools import accumulate
+
+import customtkinter as ctk
+
+# Acima deste número de linhas o documento é exibido por janelas (somente leitura)
+VIRTUAL_THRESHOLD = 5000
+
+INDEX_CHUNK = 16 * 1024 * 1024
+
+
+class LineStore:
+    # Documento em bytes (ou mmap de um arquivo) + deslocamento do início de cada linha
+    def __init__(self, data, path=None):
+        self.data = data
+        self.path = path
+        self.offsets = self._index(data)
+
+    @classmethod
+    def from_text(cls, text):
+        return cls(text.encode('utf-8'))
+
+    @classmethod
+    def from_file(cls, path):
+        # O conteúdo fica em disco; só o índice de linhas ocupa memória
+        with open(path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return cls(b'', path)
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ), path)
+
+    @staticmethod
+    def _index(data):
+        # Indexa em blocos: split + accumulate roda em C, bem mais rápido que um find por linha
+        offsets = array('q', [0])
+        size = len(data)
+        pos = 0
+        while pos < size:
+            chunk = data[pos:pos + INDEX_CHUNK]
+            end = chunk.rfind(b'\n')
+            if end == -1:
+                pos += len(chunk)
+                continue
+            starts = accumulate((len(line) + 1 for line in chunk[:end].split(b'\n')), initial=pos)
+            next(starts)
+            offsets.extend(starts)
+            pos += end + 1
+        if len(offsets) > 1 and offsets[-1] == size:
+            offsets.pop()
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def lines(self, start, stop):
+        start = max(0, start)
+        stop = min(len(self.offsets), stop)
+        if start >= stop:
+            return ''
+        end = self.offsets[stop] if stop < len(self.offsets) else len(self.data)
+        return self.data[self.offsets[start]:end].decode('utf-8', errors='replace')
+
+    def text(self):
+        return self.lines(0, len(self.offsets))
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+
+class XMLViewer(ctk.CTkFrame):
+    def __init__(self, master, font=None):
+        super().__init__(master, fg_color='transparent')
+
+        self.textbox = ctk.CTkTextbox(self, font=font, activate_scrollbars=False)
+        self.textbox.grid(row=0, column=0, sticky="nsew")
+
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.textbox.yview)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.textbox.configure(yscrollcommand=self.scrollbar.set)
+
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        self.store = None
+        self.first = 0
+        self.line_height = tkfont.Font(font=font).metrics('linespace') if font else 16
+
+        self.textbox.bind('<MouseWheel>', self._on_wheel)
+        self.textbox.bind('<Button-4>', lambda event: self.scroll(-3, 'units'))
+        self.textbox.bind('<Button-5>', lambda event: self.scroll(3, 'units'))
+        self.textbox.bind('<Prior>', lambda event: self.scroll(-1, 'pages'))
+        self.textbox.bind('<Next>', lambda event: self.scroll(1, 'pages'))
+        self.textbox.bind('<Configure>', lambda event: self._render())
+
+    def show(self, store):
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", ctk.END)
+        if len(store) <= VIRTUAL_THRESHOLD:
+            # Documento pequeno: texto inteiro e editável, como antes
+            self.store = None
+            self.textbox.insert(ctk.END, store.text())
+            self.textbox.configure(yscrollcommand=self.scrollbar.set)
+            self.scrollbar.configure(command=self.textbox.yview)
+            return
+
+        self.store = store
+        self.first = 0
+        self.textbox.configure(yscrollcommand="")
+        self.scrollbar.configure(command=self._on_scrollbar)
+        self._render()
+
+    def get_text(self):
+        if self.store is not None:
+            return self.store.text()
+        return self.textbox.get("1.0", ctk.END)
+
+    def visible_lines(self):
+        return max(1, self.textbox.winfo_height() // self.line_height)
+
+    def scroll(self, amount, what):
+        if self.store is None:
+            self.textbox.yview_scroll(amount, what)
+            return "break"
+        step = self.visible_lines() if what == 'pages' else 1
+        self._move_to(self.first + int(amount) * step)
+        return "break"
+
+    def _on_wheel(self, event):
+        return self.scroll(-3 if event.delta > 0 else 3, 'units')
+
+    def _on_scrollbar(self, action, *args):
+        if action == 'moveto':
+            self._move_to(int(float(args[0]) * len(self.store)))
+        elif action == 'scroll':
+            self.scroll(int(args[0]), args[1])
+
+    def _move_to(self, first):
+        last_first = max(0, len(self.store) - self.visible_lines())
+        first = min(max(0, first), last_first)
+        if first != self.first:
+            self.first = first
+            self._render()
+
+    def _render(self):
+        # Só as linhas que cabem na tela vão para o widget de texto
+        if self.store is None:
+            return
+        count = self.visible_lines()
+        total = len(self.store)
+        self.textbox.configure(state="normal")
+        self.textbox.delete("1.0", ctk.END)
+        self.textbox.insert(ctk.END, self.store.lines(self.first, self.first + count))
+        self.textbox.configure(state="disabled")
+        self.scrollbar.set(self.first / total, min(1.0, (self.first + count) / total))
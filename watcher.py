@@ -0,0 +1,206 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # sem o watchdog a pasta é varrida periodicamente
+    Observer = None
+
+import db
+from importer import ImportBatch, ignore_interrupt, import_file
+
+STATE_PATH = 'database/watch.db'
+
+# Um arquivo só é lido depois de passar este tempo sem mudar de tamanho/data (cópia em andamento)
+SETTLE_SECONDS = 2.0
+
+# Intervalo entre varreduras; com notificações do sistema (watchdog) é só uma garantia extra
+POLL_INTERVAL = 2.0
+NOTIFIED_POLL_INTERVAL = 30.0
+
+# Arquivos por lote: o estado e as notas são gravados a cada lote, não só no fim da fila
+BATCH_SIZE = 500
+
+# Janela usada no cálculo da vazão
+THROUGHPUT_WINDOW = 60.0
+
+
+class ProcessedFiles:
+    # Arquivos já tratados (com tamanho e data), para que um reinício não reprocesse a pasta
+    def __init__(self, path=STATE_PATH, check_same_thread=True):
+        self.conn = db.connect(path, check_same_thread=check_same_thread)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS processed_files (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                processed_at REAL NOT NULL
+            )
+        ''')
+        self.conn.commit()
+
+    def load(self):
+        return {path: (size, mtime_ns) for path, size, mtime_ns in
+                self.conn.execute("SELECT path, size, mtime_ns FROM processed_files")}
+
+    def record(self, rows):
+        # rows: (path, size, mtime_ns, status, error)
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO processed_files VALUES (?, ?, ?, ?, ?, ?)",
+                [row + (now,) for row in rows],
+            )
+
+    def close(self):
+        self.conn.close()
+
+
+class FolderWatcher:
+    def __init__(self, directory, store=None, xml_archive=None, pdf_dir=None, state=None,
+                 settle=SETTLE_SECONDS, poll_interval=None, workers=None):
+        self.directory = directory
+        self.store = store
+        self.xml_archive = xml_archive
+        self.pdf_dir = pdf_dir
+        self.state = state or ProcessedFiles()
+        self.settle = settle
+        self.workers = workers
+        self.processed = self.state.load()
+        # Arquivos vistos mas ainda não estáveis: caminho -> ((tamanho, mtime), visto desde)
+        self.pending = {}
+        self.wake = threading.Event()
+        self.stop_event = threading.Event()
+        self.observer = None
+        if poll_interval is None:
+            poll_interval = NOTIFIED_POLL_INTERVAL if Observer is not None else POLL_INTERVAL
+        self.poll_interval = poll_interval
+
+        self.started = time.time()
+        self.counters = {'processados': 0, 'duplicados': 0, 'erros': 0, 'bytes': 0}
+        self.recent = deque()
+        self.last_error = None
+
+    def scan(self):
+        # Lista a pasta só com stat: arquivos já registrados são ignorados sem leitura
+        now = time.monotonic()
+        ready = []
+        seen = set()
+        for root, dirs, names in os.walk(self.directory):
+            for name in names:
+                if not name.lower().endswith('.xml'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                key = (st.st_size, st.st_mtime_ns)
+                if self.processed.get(path) == key or not st.st_size:
+                    continue
+                seen.add(path)
+                previous = self.pending.get(path)
+                if previous is None or previous[0] != key:
+                    self.pending[path] = (key, now)
+                elif now - previous[1] >= self.settle:
+                    ready.append((path, key))
+        # Arquivos removidos antes de serem processados
+        for path in self.pending.keys() - seen:
+            del self.pending[path]
+        return ready
+
+    def process(self, pool, ready):
+        paths = [path for path, key in ready]
+        archive_path = self.xml_archive.path if self.xml_archive is not None else None
+        results = pool.map(import_file, paths, [self.pdf_dir] * len(paths), [archive_path] * len(paths))
+
+        # Notas e arquivo de XMLs gravados juntos (ImportBatch) e, por último, o estado da pasta
+        batch = ImportBatch(self.store, self.xml_archive)
+        rows = []
+        for (path, key), (file_path, size, data, prepared, error) in zip(ready, results):
+            status = 'ok'
+            if error:
+                status = 'erro'
+                self.counters['erros'] += 1
+                self.last_error = f"{path}: {error}"
+            elif batch.add(data, prepared) is None:
+                status = 'duplicado'
+                self.counters['duplicados'] += 1
+            else:
+                self.counters['processados'] += 1
+            self.counters['bytes'] += size
+            rows.append((path, key[0], key[1], status, error))
+            self.processed[path] = key
+            del self.pending[path]
+
+        batch.flush()
+        self.state.record(rows)
+        self.recent.append((time.monotonic(), len(ready)))
+
+    def metrics(self):
+        now = time.monotonic()
+        while self.recent and now - self.recent[0][0] > THROUGHPUT_WINDOW:
+            self.recent.popleft()
+        window = min(THROUGHPUT_WINDOW, time.time() - self.started) or 1.0
+        return dict(
+            self.counters,
+            backlog=len(self.pending),
+            arquivos_por_segundo=sum(count for _, count in self.recent) / window,
+            ativo_desde=self.started,
+            ultimo_erro=self.last_error,
+        )
+
+    def write_metrics(self, path):
+        # Gravação atômica: quem lê o arquivo nunca vê um JSON pela metade
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w') as file:
+            json.dump(self.metrics(), file, indent=2)
+        os.replace(temp_path, path)
+
+    def _start_observer(self):
+        if Observer is None:
+            return
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                watcher.wake.set()
+
+        self.observer = Observer()
+        self.observer.schedule(Handler(), self.directory, recursive=True)
+        self.observer.start()
+
+    def run(self, metrics_path=None, on_cycle=None):
+        self._start_observer()
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers, initializer=ignore_interrupt) as pool:
+                while not self.stop_event.is_set():
+                    ready = self.scan()
+                    for start in range(0, len(ready), BATCH_SIZE):
+                        if self.stop_event.is_set():
+                            break
+                        self.process(pool, ready[start:start + BATCH_SIZE])
+                    if metrics_path:
+                        self.write_metrics(metrics_path)
+                    if on_cycle:
+                        on_cycle(self)
+                    # Com arquivos em espera, volta logo para conferir se já estabilizaram
+                    timeout = min(self.poll_interval, self.settle) if self.pending else self.poll_interval
+                    self.wake.wait(timeout)
+                    self.wake.clear()
+        finally:
+            if self.observer is not None:
+                self.observer.stop()
+                self.observer.join()
+
+    def stop(self):
+        self.stop_event.set()
+        self.wake.set()